@@ -0,0 +1,491 @@
+import re
+import json
+import time
+import base64
+import select
+import hashlib
+import threading
+import socketserver
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-ins for every upstream the digest and the listener talk to.
+#
+# Each one takes a latency (seconds added to every request) and a payload
+# size (KB of response body to aim for), so runs can model anything from a
+# fast LAN to a slow API returning bloated responses. Everything listens on
+# 127.0.0.1 on a free port; the runner points the services at them through
+# the WEATHER_BASE_URL, NEWS_BASE_URL, CANVAS_BASE_URL, IMAP_* and SMTP_*
+# settings.
+
+class Upstream:
+    """Latency and payload size for one stand-in."""
+
+    def __init__(self, latency=0.0, payload_kb=4):
+        self.latency = latency
+        self.payload_kb = payload_kb
+
+    def delay(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def as_dict(self):
+        return {'latency_ms': round(self.latency * 1000, 3), 'payload_kb': self.payload_kb}
+
+def _fill(make_item, payload_kb, minimum=1):
+    """Items from make_item(i) until their JSON reaches about payload_kb."""
+    items, size = [], 0
+    while size < payload_kb * 1024 or len(items) < minimum:
+        item = make_item(len(items))
+        items.append(item)
+        size += len(json.dumps(item)) + 2
+    return items
+
+# -- HTTP: Visual Crossing, NewsAPI, Canvas ---------------------------------
+
+def weather_payload(location, payload_kb):
+    """A Visual Crossing timeline response; hourly entries make up the size."""
+    hours = _fill(lambda i: {
+        'datetime': f"{i % 24:02d}:00:00",
+        'temp': 50 + i % 15,
+        'feelslike': 48 + i % 15,
+        'humidity': 60.5,
+        'precipprob': 10,
+        'windspeed': 7.2,
+        'conditions': 'Partially cloudy',
+    }, payload_kb)
+    return {
+        'resolvedAddress': f"{location}, United States",
+        'currentConditions': {'temp': 54.3, 'conditions': 'Partially cloudy', 'windspeed': 6.9},
+        'days': [{'tempmax': 61.2, 'tempmin': 44.8, 'conditions': 'Partially cloudy', 'hours': hours}],
+    }
+
+def news_payload(page_size, payload_kb):
+    """A NewsAPI top-headlines response with page_size articles."""
+    per_article = max(1, payload_kb * 1024 // max(1, page_size))
+    articles = [
+        {
+            'source': {'id': None, 'name': f"Bench Wire {i}"},
+            'title': f"Benchmark headline number {i}",
+            'description': 'Lorem ipsum dolor sit amet. ' * (per_article // 56),
+            'content': 'Lorem ipsum dolor sit amet. ' * (per_article // 56),
+            'url': f"https://news.example.com/{i}",
+            'publishedAt': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        for i in range(page_size)
+    ]
+    return {'status': 'ok', 'totalResults': len(articles), 'articles': articles}
+
+def canvas_assignments(course_id, payload_kb):
+    """Upcoming assignments for one course."""
+    now = datetime.now(timezone.utc)
+    return _fill(lambda i: {
+        'id': course_id * 1000 + i,
+        'course_id': course_id,
+        'name': f"Assignment {i} for course {course_id}",
+        'description': '<p>Read the chapter and answer the questions.</p>' * 4,
+        'due_at': (now + timedelta(days=1 + i % 10, hours=i % 24)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'points_possible': 10 + i % 90,
+        'html_url': f"https://canvas.example.com/courses/{course_id}/assignments/{i}",
+        'updated_at': now.strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }, payload_kb)
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        route = self.server.route(url.path, params)
+        if route is None:
+            self._reply(404, {'error': 'not found'})
+            return
+        upstream, make_body = route
+        self.server.requests += 1
+        upstream.delay()
+        body = json.dumps(make_body()).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._reply(200, body, etag)
+
+    def _reply(self, status, body, etag=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    """Visual Crossing (/weather), NewsAPI (/news) and Canvas (/api/v1) on one port."""
+
+    daemon_threads = True
+
+    def __init__(self, weather, news, canvas, courses=4):
+        super().__init__(('127.0.0.1', 0), _HTTPHandler)
+        self.weather = weather
+        self.news = news
+        self.canvas = canvas
+        self.courses = courses
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def route(self, path, params):
+        """(upstream, body factory) for a request path, or None."""
+        match = re.fullmatch(r'/weather/([^/]+)/today', path)
+        if match:
+            return self.weather, lambda: weather_payload(match.group(1), self.weather.payload_kb)
+        if path == '/news':
+            page_size = int(params.get('pageSize', 5))
+            return self.news, lambda: news_payload(page_size, self.news.payload_kb)
+        if path == '/api/v1/users/self':
+            return self.canvas, lambda: {'id': 1, 'name': 'Bench Student'}
+        if re.fullmatch(r'/api/v1/users/[^/]+/courses', path):
+            return self.canvas, lambda: [
+                {'id': course_id, 'name': f"Course {course_id}", 'course_code': f"BEN{course_id}"}
+                for course_id in range(1, self.courses + 1)
+            ]
+        match = re.fullmatch(r'/api/v1/courses/(\d+)/assignments', path)
+        if match:
+            # Spread the payload over the courses so the total stays as configured
+            per_course = max(1, self.canvas.payload_kb // self.courses)
+            return self.canvas, lambda: canvas_assignments(int(match.group(1)), per_course)
+        return None
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-http', daemon=True).start()
+        return self
+
+# -- Gemini -------------------------------------------------------------------
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+class StandInModel:
+    """Takes the place of genai.GenerativeModel: same generate_content()
+    call shapes (plain and streamed), answering with payload_kb of HTML
+    after latency seconds. Streamed answers arrive in chunks spread over
+    the latency, like the real thing."""
+
+    CHUNKS = 8
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.calls = 0
+
+    def _html(self):
+        paragraph = '<p style="margin: 0 0 10px 0; color: #000000;">Focus on the assignment due first.</p>'
+        repeat = max(1, self.upstream.payload_kb * 1024 // len(paragraph))
+        return ('<html><body style="font-family: Arial, sans-serif;">'
+                '<h1 style="font-size: 24px;">Good morning!</h1>'
+                + paragraph * repeat + '</body></html>')
+
+    def generate_content(self, contents, *, generation_config=None, safety_settings=None,
+                         stream=False, **kwargs):
+        # Like the real 0.3.1 SDK, extra keywords become request fields, and
+        # unknown ones are rejected
+        if kwargs:
+            raise ValueError(f"Unknown field for GenerateContentRequest: {', '.join(kwargs)}")
+        self.calls += 1
+        text = self._html()
+        if not stream:
+            self.upstream.delay()
+            return _Chunk(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        step = max(1, len(text) // self.CHUNKS)
+        for start in range(0, len(text), step):
+            time.sleep(self.upstream.latency / self.CHUNKS)
+            yield _Chunk(text[start:start + step])
+
+# -- IMAP -------------------------------------------------------------------------
+
+class Mailbox:
+    """Messages held by the fake IMAP server: [uid, raw bytes, flags]."""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.messages = []
+        self.next_uid = 1
+        self.uidvalidity = 1
+        self.idling = threading.Event()
+
+    def add(self, raw):
+        with self.lock:
+            self.messages.append([self.next_uid, raw, set()])
+            self.next_uid += 1
+            self.lock.notify_all()
+
+    def add_many(self, raws):
+        with self.lock:
+            for raw in raws:
+                self.messages.append([self.next_uid, raw, set()])
+                self.next_uid += 1
+            self.lock.notify_all()
+
+def _uid_set(spec, max_uid):
+    uids = set()
+    for part in spec.split(','):
+        if ':' in part:
+            low, high = part.split(':')
+            low = max_uid if low == '*' else int(low)
+            high = max_uid if high == '*' else int(high)
+            uids.update(range(min(low, high), max(low, high) + 1))
+        else:
+            uids.add(max_uid if part == '*' else int(part))
+    return uids
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    """The IMAP4rev1 subset the listener uses: LOGIN, SELECT, IDLE, and UID
+    SEARCH/FETCH/STORE."""
+
+    def _send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode())
+        self.wfile.flush()
+
+    def handle(self):
+        mailbox, upstream = self.server.mailbox, self.server.upstream
+        self._send('* OK fake IMAP ready\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().strip().split(' ')
+            if len(parts) < 2:
+                continue
+            tag, command, args = parts[0], parts[1].upper(), parts[2:]
+            upstream.delay()
+            if command == 'CAPABILITY':
+                self._send(f'* CAPABILITY IMAP4rev1 IDLE\r\n{tag} OK CAPABILITY completed\r\n')
+            elif command in ('LOGIN', 'NOOP', 'CHECK'):
+                self._send(f'{tag} OK {command} completed\r\n')
+            elif command == 'LOGOUT':
+                self._send(f'* BYE\r\n{tag} OK LOGOUT completed\r\n')
+                return
+            elif command == 'SELECT':
+                with mailbox.lock:
+                    self._send(f'* {len(mailbox.messages)} EXISTS\r\n'
+                               f'* OK [UIDVALIDITY {mailbox.uidvalidity}]\r\n'
+                               f'* OK [UIDNEXT {mailbox.next_uid}]\r\n'
+                               f'{tag} OK [READ-WRITE] SELECT completed\r\n')
+            elif command == 'IDLE':
+                if not self._idle(tag, mailbox):
+                    return
+            elif command == 'UID' and args:
+                self._uid(tag, args[0].upper(), args[1:], mailbox)
+            else:
+                self._send(f'{tag} BAD unsupported command\r\n')
+
+    def _idle(self, tag, mailbox):
+        self._send('+ idling\r\n')
+        mailbox.idling.set()
+        with mailbox.lock:
+            count = len(mailbox.messages)
+        while True:
+            with mailbox.lock:
+                mailbox.lock.wait(0.05)
+                if len(mailbox.messages) > count:
+                    count = len(mailbox.messages)
+                    self._send(f'* {count} EXISTS\r\n')
+            if select.select([self.connection], [], [], 0)[0]:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b'DONE':
+                    mailbox.idling.clear()
+                    self._send(f'{tag} OK IDLE terminated\r\n')
+                    return True
+
+    def _uid(self, tag, command, args, mailbox):
+        with mailbox.lock:
+            max_uid = mailbox.messages[-1][0] if mailbox.messages else 0
+            if command == 'SEARCH':
+                criteria = ' '.join(args).upper()
+                if criteria == 'UNSEEN':
+                    uids = [m[0] for m in mailbox.messages if '\\Seen' not in m[2]]
+                elif criteria == 'ALL':
+                    uids = [m[0] for m in mailbox.messages]
+                else:
+                    wanted = _uid_set(args[-1], max_uid)
+                    uids = [m[0] for m in mailbox.messages if m[0] in wanted]
+                self._send('* SEARCH ' + ' '.join(map(str, uids)) + f'\r\n{tag} OK SEARCH completed\r\n')
+            elif command == 'FETCH':
+                wanted = _uid_set(args[0], max_uid)
+                for number, (uid, raw, _) in enumerate(mailbox.messages, 1):
+                    if uid in wanted:
+                        self._send(f'* {number} FETCH (UID {uid} BODY[] {{{len(raw)}}}\r\n'.encode() + raw + b')\r\n')
+                self._send(f'{tag} OK FETCH completed\r\n')
+            elif command == 'STORE':
+                wanted = _uid_set(args[0], max_uid)
+                for message in mailbox.messages:
+                    if message[0] in wanted:
+                        message[2].add('\\Seen')
+                self._send(f'{tag} OK STORE completed\r\n')
+            else:
+                self._send(f'{tag} BAD unsupported UID command\r\n')
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, upstream, mailbox=None):
+        super().__init__(('127.0.0.1', 0), _IMAPHandler)
+        self.upstream = upstream
+        self.mailbox = mailbox or Mailbox()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-imap', daemon=True).start()
+        return self
+
+# -- SMTP -------------------------------------------------------------------------
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Plain ESMTP with AUTH PLAIN/LOGIN; every accepted message is counted."""
+
+    def _send(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        self._send('220 fake SMTP ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self._send('250-fake.local\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 52428800')
+            elif verb == 'HELO':
+                self._send('250 fake.local')
+            elif verb == 'AUTH':
+                mechanism = command.split(' ')[1].upper() if ' ' in command else ''
+                if mechanism == 'LOGIN':
+                    self._send('334 ' + base64.b64encode(b'Username:').decode())
+                    self.rfile.readline()
+                    self._send('334 ' + base64.b64encode(b'Password:').decode())
+                    self.rfile.readline()
+                self._send('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                recipients = []
+                self._send('250 OK')
+            elif verb == 'RCPT':
+                match = re.search(r'<([^>]*)>', command)
+                recipients.append(match.group(1) if match else command)
+                self._send('250 OK')
+            elif verb == 'DATA':
+                self._send('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data)
+                server.upstream.delay()
+                server.accept(recipients, size)
+                self._send('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._send('250 OK')
+            elif verb == 'QUIT':
+                self._send('221 Bye')
+                return
+            else:
+                self._send('502 Command not implemented')
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, upstream):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.upstream = upstream
+        self.delivered = 0
+        self.bytes = 0
+        self._cond = threading.Condition()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def accept(self, recipients, size):
+        with self._cond:
+            self.delivered += 1
+            self.bytes += size
+            self._cond.notify_all()
+
+    def wait_for(self, count, timeout):
+        """Wait until count messages have been delivered in total; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.delivered < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-smtp', daemon=True).start()
+        return self
+
+# -- HealthAutoExport files ----------------------------------------------------
+
+def write_health_export(path, size_mb):
+    """Write a HealthAutoExport-style file of roughly size_mb. The summary
+    and trend metrics come first, followed by minute-level heart rate
+    samples (a metric the parser skips) that make up the bulk."""
+    target = int(size_mb * 1024 * 1024)
+    now = datetime.now().astimezone().replace(second=0, microsecond=0)
+
+    def samples(count, step, value):
+        return [
+            {'date': (now - step * i).strftime('%Y-%m-%d %H:%M:%S %z'), 'qty': value(i), 'source': 'Bench Watch'}
+            for i in range(count)
+        ]
+
+    with open(path, 'w') as f:
+        f.write('{"data": {"metrics": [')
+        daily = timedelta(days=1)
+        summary = [
+            ('step_count', 'count', lambda i: 8000 + i % 4000),
+            ('active_energy', 'kcal', lambda i: 400.5 + i % 200),
+            ('walking_running_distance', 'mi', lambda i: 3.1 + (i % 30) / 10),
+        ]
+        for name, units, value in summary:
+            f.write(json.dumps({'name': name, 'units': units, 'data': samples(365, daily, value)}) + ', ')
+
+        f.write('{"name": "heart_rate", "units": "count/min", "data": [')
+        written, i = f.tell(), 0
+        minute = timedelta(minutes=1)
+        while written < target:
+            point = json.dumps({
+                'date': (now - minute * i).strftime('%Y-%m-%d %H:%M:%S %z'),
+                'Min': 58 + i % 20, 'Avg': 68 + i % 20, 'Max': 80 + i % 20, 'source': 'Bench Watch',
+            })
+            f.write((', ' if i else '') + point)
+            written += len(point) + 2
+            i += 1
+        f.write(']}]}}')
@@ -0,0 +1,319 @@
+"""Offline benchmark for the morning digest and the email listener.
+
+Runs MorningDigest.generate_digest and the listener's handling loop
+against the local stand-ins in benchmarks/fakes.py and prints one JSON
+document with end-to-end digest latency, listener throughput and the
+memory needed to parse a large HealthAutoExport file:
+
+    python benchmarks/run.py --runs 10 --latency-ms 80 --output bench.json
+
+Needs the packages in requirements.txt, but no network access, accounts
+or .env. Calendar is left unconfigured (there is no stand-in for the
+Google API).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+from email.message import EmailMessage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import (
+    Upstream, FakeHTTPServer, FakeIMAPServer, FakeSMTPServer, StandInModel, write_health_export
+)
+
+SCHEMA_VERSION = 1
+UPSTREAMS = ('weather', 'news', 'canvas', 'gemini', 'imap', 'smtp')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5, help="digest runs to time")
+    parser.add_argument('--messages', type=int, default=200, help="emails for the listener to answer")
+    parser.add_argument('--senders', type=int, default=20, help="distinct senders the emails come from")
+    parser.add_argument('--health-mb', type=float, default=50, help="size of the large health export")
+    parser.add_argument('--digest-health-mb', type=float, default=1, help="size of the export the digest reads")
+    parser.add_argument('--courses', type=int, default=4, help="Canvas courses")
+    parser.add_argument('--latency-ms', type=float, default=50, help="default latency for every stand-in")
+    parser.add_argument('--payload-kb', type=int, default=16, help="default response size for the HTTP stand-ins")
+    for name in UPSTREAMS:
+        parser.add_argument(f'--{name}-latency-ms', type=float, help=f"latency for the {name} stand-in")
+        parser.add_argument(f'--{name}-payload-kb', type=int, help=f"payload size for the {name} stand-in")
+    parser.add_argument('--gemini-deadline', type=float, default=20, help="GEMINI_DEADLINE for the runs")
+    parser.add_argument('--warm', action='store_true',
+                        help="keep the response, Canvas and Gemini caches (default: every run goes upstream)")
+    parser.add_argument('--prefetch', action='store_true',
+                        help="prefetch (untimed) before each digest run, as the scheduled send does")
+    parser.add_argument('--skip', action='append', default=[], choices=('digest', 'listener', 'health'),
+                        help="leave out a benchmark (repeatable)")
+    parser.add_argument('--output', help="also write the results to this file")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch directory")
+    parser.add_argument('--verbose', action='store_true', help="show the services' own output")
+    return parser.parse_args(argv)
+
+def build_upstreams(args):
+    upstreams = {}
+    for name in UPSTREAMS:
+        latency = getattr(args, f'{name}_latency_ms')
+        payload = getattr(args, f'{name}_payload_kb')
+        upstreams[name] = Upstream(
+            (args.latency_ms if latency is None else latency) / 1000,
+            args.payload_kb if payload is None else payload
+        )
+    return upstreams
+
+def distribution(values_ms):
+    """Summary of a list of millisecond timings."""
+    from services import tracing
+    ordered = sorted(values_ms)
+    return {
+        'count': len(ordered),
+        'min': round(ordered[0], 1),
+        'p50': round(tracing.percentile(ordered, 0.5), 1),
+        'p95': round(tracing.percentile(ordered, 0.95), 1),
+        'max': round(ordered[-1], 1),
+        'mean': round(sum(ordered) / len(ordered), 1),
+    }
+
+def stage_summary(db, kind, since):
+    """{stage: {count, p50, p95, max}} from the spans recorded since then."""
+    from services import tracing
+    stages = {}
+    for span_kind, name, count, p50, p95, _, worst in tracing.summarize(db.get_span_durations(since, time.time() + 1)):
+        if span_kind == kind:
+            stages[name] = {'count': count, 'p50': round(p50, 1), 'p95': round(p95, 1), 'max': round(worst, 1)}
+    return stages
+
+def measure(make_call):
+    """(seconds, peak traced MB) for a call built by make_call(). tracemalloc
+    slows parsing several times over, so the time comes from a separate,
+    untraced call."""
+    call = make_call()
+    started = time.perf_counter()
+    call()
+    elapsed = time.perf_counter() - started
+
+    call = make_call()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(elapsed, 3), round(peak / (1024 * 1024), 2)
+
+def bench_health(args, workdir):
+    from services.health import HealthService
+    from services.database_service import DatabaseService
+
+    directory = os.path.join(workdir, 'large-health')
+    os.makedirs(directory)
+    path = os.path.join(directory, 'HealthAutoExport-bench.json')
+    write_health_export(path, args.health_mb)
+
+    summary_seconds, summary_peak = measure(lambda: HealthService(directory).get_daily_summary)
+
+    databases = []
+    def make_ingest():
+        # A fresh database each time, or the second pass finds nothing new
+        databases.append(DatabaseService(os.path.join(workdir, f'health-bench-{len(databases)}.db')))
+        return HealthService(directory, db=databases[-1]).ingest_exports
+    ingest_seconds, ingest_peak = measure(make_ingest)
+    for db in databases:
+        db.close()
+    return {
+        'file_mb': round(os.path.getsize(path) / (1024 * 1024), 2),
+        'daily_summary': {'seconds': summary_seconds, 'peak_mb': summary_peak},
+        'ingest': {'seconds': ingest_seconds, 'peak_mb': ingest_peak},
+    }
+
+def bench_digest(args, digest, smtp):
+    since = time.time()
+    latencies = []
+    for _ in range(args.runs):
+        if args.prefetch:
+            digest.prefetch()
+        expected = smtp.delivered + 1
+        started = time.perf_counter()
+        digest.generate_digest()
+        digest.email.flush(60)
+        if not smtp.wait_for(expected, 60):
+            raise RuntimeError("Digest was never delivered to the SMTP stand-in")
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        'runs': args.runs,
+        'first_run_ms': round(latencies[0], 1),
+        'latency_ms': distribution(latencies),
+        'stages_ms': stage_summary(digest.db, 'digest', since),
+    }
+
+def listener_messages(args, payload_kb):
+    """Plain questions (no calendar commands) padded to about payload_kb each."""
+    filler = "Some more context about my week. " * max(0, payload_kb * 1024 // 34)
+    raws = []
+    for i in range(args.messages):
+        message = EmailMessage()
+        message['From'] = f"student{i % args.senders}@bench.local"
+        message['To'] = os.environ['EMAIL_ADDRESS']
+        message['Subject'] = f"Question {i}"
+        message.set_content(f"What should I work on first today? (message {i})\n\n{filler}")
+        raws.append(message.as_bytes())
+    return raws
+
+def bench_listener(args, digest, imap, smtp):
+    since = time.time()
+    listener = digest.email_listener
+    listener.start()
+    try:
+        if not imap.mailbox.idling.wait(30):
+            raise RuntimeError("Listener never reached IDLE on the IMAP stand-in")
+        raws = listener_messages(args, imap.upstream.payload_kb)
+        baseline = smtp.delivered
+        started = time.perf_counter()
+        imap.mailbox.add_many(raws)
+        smtp.wait_for(baseline + len(raws), max(60, len(raws)))
+        elapsed = time.perf_counter() - started
+    finally:
+        listener.stop()
+    answered = min(len(raws), smtp.delivered - baseline)
+    return {
+        'messages': len(raws),
+        'answered': answered,
+        'workers': listener.worker_count,
+        'seconds': round(elapsed, 3),
+        'messages_per_sec': round(answered / elapsed, 2),
+        'stages_ms': stage_summary(digest.db, 'listener', since),
+    }
+
+def settings(args, workdir, http, imap, smtp):
+    values = {
+        'EMAIL_TEST_MODE': 'false',
+        'EMAIL_ADDRESS': 'digest@bench.local',
+        'EMAIL_PASSWORD': 'bench-password',
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(smtp.port),
+        'SMTP_SSL': 'false',
+        'SMTP_STARTTLS': 'false',
+        'IMAP_SERVER': '127.0.0.1',
+        'IMAP_PORT': str(imap.port),
+        'IMAP_SSL': 'false',
+        'IMAP_RECONNECT_BASE': '0.5',
+        'WEATHER_API_KEY': 'bench',
+        'WEATHER_BASE_URL': f"{http.base_url}/weather",
+        'NEWS_API_KEY': 'bench',
+        'NEWS_BASE_URL': f"{http.base_url}/news",
+        'CANVAS_API_KEY': 'bench',
+        'CANVAS_BASE_URL': http.base_url,
+        'HEALTH_DATA_PATH': os.path.join(workdir, 'health'),
+        'GEMINI_DEADLINE': str(args.gemini_deadline),
+    }
+    if not args.warm:
+        values.update({
+            'WEATHER_CACHE_TTL': '0',
+            'NEWS_CACHE_TTL': '0',
+            'CANVAS_SYNC_INTERVAL': '0',
+            'GEMINI_CACHE_TTL': '0',
+        })
+    return values
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def run(args):
+    upstreams = build_upstreams(args)
+    workdir = tempfile.mkdtemp(prefix='digest-bench-')
+    previous_cwd = os.getcwd()
+    http = FakeHTTPServer(upstreams['weather'], upstreams['news'], upstreams['canvas'], args.courses).start()
+    imap = FakeIMAPServer(upstreams['imap']).start()
+    smtp = FakeSMTPServer(upstreams['smtp']).start()
+    results = {
+        'schema_version': SCHEMA_VERSION,
+        'started_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'runs': args.runs,
+            'messages': args.messages,
+            'senders': args.senders,
+            'courses': args.courses,
+            'health_mb': args.health_mb,
+            'digest_health_mb': args.digest_health_mb,
+            'gemini_deadline': args.gemini_deadline,
+            'warm_caches': args.warm,
+            'prefetch': args.prefetch,
+            'upstreams': {name: upstream.as_dict() for name, upstream in upstreams.items()},
+        },
+    }
+    try:
+        os.chdir(workdir)
+        # main loads .env when imported; the stand-in settings are applied after it
+        import main as app
+        os.environ.update(settings(args, workdir, http, imap, smtp))
+        for name in ('GOOGLE_CALENDAR_CREDENTIALS', 'GEMINI_API_KEY'):
+            os.environ.pop(name, None)
+        os.makedirs(os.environ['HEALTH_DATA_PATH'])
+        write_health_export(os.path.join(os.environ['HEALTH_DATA_PATH'], 'HealthAutoExport-digest.json'),
+                            args.digest_health_mb)
+
+        if 'health' not in args.skip:
+            results['health'] = bench_health(args, workdir)
+
+        digest = app.MorningDigest()
+        gemini = StandInModel(upstreams['gemini'])
+        digest.gemini.model = gemini
+        if 'digest' not in args.skip:
+            results['digest'] = bench_digest(args, digest, smtp)
+            results['digest']['gemini_calls'] = gemini.calls
+        if 'listener' not in args.skip:
+            results['listener'] = bench_listener(args, digest, imap, smtp)
+
+        digest.email.flush(60)
+        digest.db.close()
+        results['http_requests'] = http.requests
+        results['emails_delivered'] = smtp.delivered
+        try:
+            import resource
+            # ru_maxrss is in KB on Linux
+            results['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            pass
+    finally:
+        os.chdir(previous_cwd)
+        for server in (http, imap, smtp):
+            server.shutdown()
+        if args.keep:
+            results['workdir'] = workdir
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = sys.stdout
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        results = run(args)
+    document = json.dumps(results, indent=2)
+    print(document, file=output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+
+if __name__ == "__main__":
+    main()
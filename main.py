@@ -1,7 +1,11 @@
-import os
-import schedule
 import time
+STARTUP_BEGAN = time.perf_counter()
+import os
 import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from services.health import HealthService
@@ -13,6 +17,12 @@ from services.gemini_service import GeminiService
 from services.canvas_service import CanvasService
 from services.database_service import DatabaseService
 from services.email_listener_service import EmailListenerService
+from services.shared_fetch import SharedFetchCache
+from services.response_cache import ResponseCache
+from services.lazy import LazyService
+from services.scheduler import Scheduler
+from services import tracing
+IMPORT_TIME = time.perf_counter() - STARTUP_BEGAN
 
 # Load environment variables and print debug info
 load_dotenv(override=True)  # Force override of existing env vars
@@ -33,71 +43,357 @@ print(f"Email configured: {bool(os.getenv('EMAIL_ADDRESS') and os.getenv('EMAIL_
 print(f"Canvas configured: {bool(os.getenv('CANVAS_API_KEY'))}")
 print(f"Loading from: {os.path.abspath('.env')}\n")
 
+# Shown in place of a section whose source missed its deadline
+SOURCE_TIMEOUT_PLACEHOLDERS = {
+    'health': "<li>⏱️ Health data took too long to load</li>",
+    'calendar': "<li>⏱️ Calendar took too long to respond</li>",
+    'weather': "<div>⏱️ Weather service took too long to respond</div>",
+    'news': "<li>⏱️ News service took too long to respond</li>",
+    'assignments': "<li>⏱️ Canvas took too long to respond</li>",
+}
+
+# When the scheduled digest goes out (DIGEST_TIMEZONE, or local time);
+# roster users can set their own send_time and timezone
+SEND_TIME = "07:00"
+
+# How old (seconds) a prefetched section may be at send time before it's
+# fetched again; PREFETCH_MAX_AGE_<NAME> overrides
+PREFETCH_MAX_AGE = {
+    'health': 3600,
+    'calendar': 600,
+    'weather': 1800,
+    'news': 3600,
+    'assignments': 1800,
+}
+
+def _service(name):
+    """Attribute that builds the named service on first access."""
+    return property(lambda self: self._services[name].get())
+
 class MorningDigest:
+    # Services are built on first use (see LazyService), so startup doesn't
+    # wait on SDK imports, token loading or network calls it may not need
+    db = _service('db')
+    health = _service('health')
+    calendar = _service('calendar')
+    weather = _service('weather')
+    news = _service('news')
+    canvas = _service('canvas')
+    email = _service('email')
+    gemini = _service('gemini')
+    email_listener = _service('email_listener')
+
     def __init__(self):
-        self.health = HealthService(
-            os.getenv('HEALTH_DATA_PATH', 'data/health')
-        )
-        self.calendar = GoogleCalendarService()
-        self.weather = WeatherService(os.getenv('WEATHER_API_KEY'))
-        self.news = NewsService()
-        self.canvas = CanvasService()
-        self.email = EmailService(
-            os.getenv('EMAIL_ADDRESS'),
-            os.getenv('EMAIL_PASSWORD')
-        )
-        self.gemini = GeminiService()
-        self.db = DatabaseService()
-        self.email_listener = EmailListenerService(
-            os.getenv('EMAIL_ADDRESS'),
-            os.getenv('EMAIL_PASSWORD'),
-            self.db
+        factories = {
+            'db': lambda: tracing.attach(DatabaseService()),
+            'health': lambda: HealthService(
+                os.getenv('HEALTH_DATA_PATH', 'data/health'),
+                db=self.db
+            ),
+            'calendar': lambda: GoogleCalendarService(db=self.db),
+            'response_cache': lambda: ResponseCache(self.db),
+            'weather': lambda: WeatherService(
+                os.getenv('WEATHER_API_KEY'),
+                cache=self._services['response_cache'].get()
+            ),
+            'news': lambda: NewsService(cache=self._services['response_cache'].get()),
+            'canvas': lambda: CanvasService(db=self.db),
+            'email': lambda: EmailService(
+                os.getenv('EMAIL_ADDRESS'),
+                os.getenv('EMAIL_PASSWORD')
+            ),
+            'gemini': lambda: GeminiService(db=self.db),
+            # The listener shares our email, calendar and Gemini services
+            'email_listener': lambda: EmailListenerService(
+                os.getenv('EMAIL_ADDRESS'),
+                os.getenv('EMAIL_PASSWORD'),
+                self.db,
+                email_service=self._services['email'],
+                calendar_service=self._services['calendar'],
+                gemini=self._services['gemini']
+            ),
+        }
+        self._services = {name: LazyService(name, factory) for name, factory in factories.items()}
+        # Default per-source deadline and overall budget for the gathering phase (seconds)
+        self.source_timeout = float(os.getenv('SOURCE_TIMEOUT', '15'))
+        self.fetch_budget = float(os.getenv('DIGEST_FETCH_BUDGET', '30'))
+        # How long Gemini may take to compose the email before the template is sent instead
+        self.gemini_deadline = float(os.getenv('GEMINI_DEADLINE', '20'))
+        # Spans older than this are dropped after each digest run
+        self.trace_retention_days = int(os.getenv('TRACE_RETENTION_DAYS', '30'))
+        # Sources and the Gemini draft are fetched this many minutes before
+        # the scheduled send; at send time stale sections get PREFETCH_SEND_BUDGET
+        # seconds to refresh before their prefetched copy is used instead
+        self.prefetch_lead = float(os.getenv('PREFETCH_LEAD_MINUTES', '15'))
+        self.send_budget = float(os.getenv('PREFETCH_SEND_BUDGET', '5'))
+        self._warm = {}
+        self._warm_lock = threading.Lock()
+
+    def _digest_sources(self):
+        """Map each digest section to the call that fetches it."""
+        today = datetime.now()
+        tomorrow = today + timedelta(days=1)
+        # Services are looked up inside the calls so they're built in parallel
+        return {
+            'health': lambda: self.health.get_daily_summary(),
+            'calendar': lambda: self.calendar.get_events(today, tomorrow),
+            'weather': lambda: self.weather.get_daily_forecast(),
+            'news': lambda: self.news.get_top_stories(),
+            'assignments': lambda: self.canvas.get_assignments(),
+        }
+
+    def warm_up(self, names=None):
+        """Build services concurrently ahead of their first use."""
+        names = names or list(self._services)
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix='startup') as executor:
+            futures = {executor.submit(self._services[name].get): name for name in names}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Failed to initialize {futures[future]}: {str(e)}")
+
+    def startup_report(self):
+        """Print how long imports and each service built so far took."""
+        built = sorted(
+            (service for service in self._services.values() if service.ready),
+            key=lambda service: service.elapsed,
+            reverse=True
         )
+        timings = ', '.join(f"{service.name} {service.elapsed * 1000:.0f}ms" for service in built)
+        print(f"Startup: imports {IMPORT_TIME * 1000:.0f}ms; services: {timings or 'none yet'}")
+
+    def _source_deadline(self, name):
+        """Deadline for one source; SOURCE_TIMEOUT_<NAME> overrides the default."""
+        return float(os.getenv(f'SOURCE_TIMEOUT_{name.upper()}', self.source_timeout))
+
+    def _placeholder(self, name, error=None):
+        """Section shown for a source that failed (error) or timed out (None)."""
+        if error is not None:
+            return f"<li>Unable to fetch {name}: {str(error)}</li>"
+        return SOURCE_TIMEOUT_PLACEHOLDERS.get(name, f"<li>⏱️ {name} took too long to respond</li>")
+
+    def _gather_sources(self, sources):
+        """Fetch all sources concurrently, substituting a placeholder for any
+        source that fails or misses its deadline or the overall budget."""
+        results, missed = self._fetch_sources(sources)
+        for name, error in missed.items():
+            if error is None:
+                print(f"Source '{name}' missed its deadline, using placeholder")
+            results[name] = self._placeholder(name, error)
+        return results
+
+    def _fetch_sources(self, sources, budget=None):
+        """Fetch sources concurrently within their deadlines and the overall
+        budget (DIGEST_FETCH_BUDGET by default). Returns (results, missed),
+        where missed maps each failed source to its exception and each
+        timed-out source to None."""
+        started = time.monotonic()
+        budget_end = started + (self.fetch_budget if budget is None else budget)
+        results = {}
+        missed = {}
+
+        executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='digest-source')
+        futures = {
+            executor.submit(tracing.bind(tracing.traced(f'source.{name}', fetch))): name
+            for name, fetch in sources.items()
+        }
+        deadlines = {
+            future: min(started + self._source_deadline(name), budget_end)
+            for future, name in futures.items()
+        }
+        pending = set(futures)
+        timed_out = []
+        try:
+            while pending:
+                now = time.monotonic()
+                expired = {future for future in pending if deadlines[future] <= now and not future.done()}
+                timed_out.extend(expired)
+                pending -= expired
+                if not pending:
+                    break
+                next_deadline = min(deadlines[future] for future in pending)
+                done, pending = wait(pending, timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures[future]
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        missed[name] = e
+        finally:
+            # Don't wait on stragglers; their results are discarded
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for future in timed_out:
+            missed[futures[future]] = None
+
+        print(f"Gathered {len(sources)} sources in {time.monotonic() - started:.2f}s")
+        return results, missed
+
+    def _max_age(self, name):
+        return float(os.getenv(f'PREFETCH_MAX_AGE_{name.upper()}', PREFETCH_MAX_AGE.get(name, 900)))
+
+    def prefetch(self):
+        """Fetch every source and draft the Gemini email ahead of the
+        scheduled send. The draft lands in the generation cache, so a send
+        with unchanged data reuses it instead of calling Gemini again."""
+        try:
+            with tracing.trace('prefetch'):
+                with tracing.span('gather'):
+                    results, missed = self._fetch_sources(self._digest_sources())
+                fetched_at = time.time()
+                with self._warm_lock:
+                    self._warm = {name: (value, fetched_at) for name, value in results.items()}
+                if missed:
+                    print(f"Prefetch missed {', '.join(missed)}; they'll be fetched at send time")
+
+                data = dict(results)
+                for name, error in missed.items():
+                    data[name] = self._placeholder(name, error)
+                try:
+                    with tracing.span('draft'):
+                        self.gemini.generate_email(
+                            data['health'],
+                            data['calendar'],
+                            data['weather'],
+                            data['news'],
+                            data['assignments'],
+                            deadline=time.monotonic() + self.gemini_deadline
+                        )
+                except Exception as e:
+                    print(f"Gemini draft not prefetched: {str(e)}")
+            print(f"Prefetched {len(results)} sources at {datetime.now()}")
+
+        except Exception as e:
+            print(f"Error prefetching digest: {str(e)}")
+
+    def _take_warm(self):
+        """The prefetched sections, {name: (value, fetched_at)}; each prefetch
+        is used once, and one left over from a skipped send is dropped."""
+        with self._warm_lock:
+            warm, self._warm = self._warm, {}
+        oldest = time.time() - max(2 * self.prefetch_lead * 60, 3600)
+        return {name: entry for name, entry in warm.items() if entry[1] >= oldest}
+
+    def _refresh_stale(self, warm):
+        """Source data for a send from prefetched copies: sections older than
+        their max age are fetched again within the send budget, and any
+        refresh that fails or runs late is served from its warm copy."""
+        sources = self._digest_sources()
+        now = time.time()
+        stale = {
+            name: fetch for name, fetch in sources.items()
+            if name not in warm or now - warm[name][1] > self._max_age(name)
+        }
+        data = {name: value for name, (value, _) in warm.items() if name in sources}
+        if not stale:
+            print("All prefetched sources are fresh")
+            return data
+
+        print(f"Refreshing stale sources: {', '.join(stale)}")
+        results, missed = self._fetch_sources(stale, budget=self.send_budget)
+        data.update(results)
+        for name, error in missed.items():
+            if name in warm:
+                print(f"Refresh of '{name}' {'failed' if error else 'ran late'}; using the prefetched copy")
+            else:
+                data[name] = self._placeholder(name, error)
+        return data
 
     def generate_digest(self):
         try:
-            today = datetime.now()
-            tomorrow = today + timedelta(days=1)
+            with tracing.trace('digest'):
+                started = time.monotonic()
+                warm = self._take_warm()
+                if warm:
+                    # Prefetched: only refresh what went stale, and keep Gemini
+                    # (normally answered from the cache) inside the send budget
+                    with tracing.span('refresh'):
+                        data = self._refresh_stale(warm)
+                    gemini_deadline = max(1.0, started + self.send_budget - time.monotonic())
+                else:
+                    # Gather raw data
+                    with tracing.span('gather'):
+                        data = self._gather_sources(self._digest_sources())
+                    gemini_deadline = None
+                self._deliver_digest(data, gemini_deadline=gemini_deadline)
+            # Delivery happens in the mail outbox, which reports it
+            print(f"Morning digest queued at {datetime.now()}")
+            self.db.prune_spans(time.time() - self.trace_retention_days * 86400)
+
+        except Exception as e:
+            print(f"Error generating digest: {str(e)}")
 
-            # Gather raw data
-            health_data = self.health.get_daily_summary()
-            calendar_events = self.calendar.get_events(today, tomorrow)
-            weather_info = self.weather.get_daily_forecast()
-            news_updates = self.news.get_top_stories()
-            assignments = self.canvas.get_assignments()
+    def _deliver_digest(self, data, recipient=None, gemini_deadline=None):
+        """Store, compose and send a digest from gathered source data.
+        gemini_deadline (seconds) overrides GEMINI_DEADLINE."""
+        health_data = data['health']
+        calendar_events = data['calendar']
+        weather_info = data['weather']
+        news_updates = data['news']
+        assignments = data['assignments']
 
-            # Store the digest data in the database
+        # Store the digest data in the database
+        with tracing.span('store_digest'):
             self.db.store_digest(
                 health_data,
                 calendar_events,
                 weather_info,
                 news_updates,
-                assignments
+                assignments,
+                recipient=recipient
             )
 
-            # Try to get Gemini-generated content
-            gemini_content = self.gemini.generate_email(
-                health_data,
-                calendar_events,
-                weather_info,
-                news_updates,
-                assignments
-            )
+        content = self._compose_digest(
+            health_data,
+            calendar_events,
+            weather_info,
+            news_updates,
+            assignments,
+            recipient=recipient,
+            gemini_deadline=gemini_deadline
+        )
 
-            # Use Gemini content if available, otherwise fall back to default formatting
-            content = gemini_content if gemini_content else self._format_email_content(
-                health_data,
-                calendar_events,
-                weather_info,
-                news_updates,
-                assignments
-            )
+        with tracing.span('send'):
+            self.email.send_digest(content, to=recipient)
 
-            self.email.send_digest(content)
-            print(f"Morning digest sent successfully at {datetime.now()}")
+    def _compose_digest(self, health_data, events, weather, news, assignments, recipient=None,
+                        gemini_deadline=None):
+        """Race Gemini against the template: the template is rendered up front
+        and Gemini gets GEMINI_DEADLINE (or gemini_deadline) seconds to beat it."""
+        started = time.monotonic()
+        with tracing.span('render'):
+            template = self._format_email_content(health_data, events, weather, news, assignments)
+        deadline = started + (self.gemini_deadline if gemini_deadline is None else gemini_deadline)
 
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='digest-compose')
+        future = executor.submit(
+            tracing.bind(tracing.traced('gemini', self.gemini.generate_email)),
+            health_data,
+            events,
+            weather,
+            news,
+            assignments,
+            deadline=deadline
+        )
+        # The streamed generation gives up by itself once the deadline passes
+        executor.shutdown(wait=False)
+        try:
+            gemini_content = future.result(timeout=max(0, deadline - time.monotonic()))
+            reason = 'ok' if gemini_content else 'unavailable'
+        except (FutureTimeout, TimeoutError):
+            gemini_content = None
+            reason = 'timeout'
         except Exception as e:
-            print(f"Error generating digest: {str(e)}")
+            gemini_content = None
+            # The SDK reports its own request timeout as DeadlineExceeded
+            reason = 'timeout' if type(e).__name__ == 'DeadlineExceeded' else 'error'
+
+        latency_ms = int((time.monotonic() - started) * 1000)
+        winner = 'gemini' if gemini_content else 'template'
+        print(f"Digest composed by {winner} ({reason}) in {latency_ms / 1000:.2f}s")
+        self.db.record_generation_outcome(recipient, winner, reason, latency_ms)
+        return gemini_content or template
 
     def _format_email_content(self, health_data, events, weather, news, assignments):
         # Fallback formatting if Gemini is not available
@@ -126,38 +422,225 @@ class MorningDigest:
     def _format_assignments(self, assignments):
         return f"<ul style='margin: 0; padding-left: 20px'>{assignments}</ul>"
 
+def load_roster(path):
+    """Load the batch roster: a JSON list of users, each with at least an 'email'."""
+    with open(path, 'r') as f:
+        roster = json.load(f)
+    for user in roster:
+        if not user.get('email'):
+            raise ValueError(f"Roster entry without an email: {user}")
+    return roster
+
+class BatchDigest:
+    """Generates digests for a roster of users in one run.
+
+    Weather and news are fetched once per distinct location / language and
+    page size and shared across users; per-user sources (health, calendar,
+    Canvas) run on a bounded pool of BATCH_WORKERS users at a time.
+    """
+
+    def __init__(self, digest, roster):
+        self.digest = digest
+        self.roster = roster
+        self.max_workers = int(os.getenv('BATCH_WORKERS', '8'))
+
+    def _user_sources(self, user, shared):
+        digest = self.digest
+        today = datetime.now()
+        tomorrow = today + timedelta(days=1)
+        location = user.get('zip_code') or digest.weather.location
+        language = user.get('news_language', 'en')
+        page_size = int(user.get('news_page_size', 5))
+        # Each user's own exports only; never fall back to ours for them
+        health = HealthService(user.get('health_data_path'), db=digest.db)
+
+        def fetch_calendar():
+            calendar = GoogleCalendarService(
+                token_path=user.get('google_token', f"tokens/{user['email']}.pickle"),
+                interactive=False,
+                db=digest.db
+            )
+            return calendar.get_events(today, tomorrow)
+
+        return {
+            'health': health.get_daily_summary,
+            'calendar': fetch_calendar,
+            'weather': lambda: shared.get(
+                ('weather', location),
+                lambda: digest.weather.get_daily_forecast(location)
+            ),
+            'news': lambda: shared.get(
+                ('news', language, page_size),
+                lambda: digest.news.get_top_stories(page_size, language=language)
+            ),
+            'assignments': lambda: CanvasService(user.get('canvas_api_key', ''), db=digest.db).get_assignments(),
+        }
+
+    def _run_user(self, user, shared):
+        with tracing.trace('digest'):
+            with tracing.span('gather'):
+                data = self.digest._gather_sources(self._user_sources(user, shared))
+            self.digest._deliver_digest(data, recipient=user['email'])
+
+    def run(self):
+        started = time.monotonic()
+        shared = SharedFetchCache()
+        sent = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='digest-user') as pool:
+            futures = {pool.submit(self._run_user, user, shared): user['email'] for user in self.roster}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    sent += 1
+                except Exception as e:
+                    print(f"Error generating digest for {futures[future]}: {str(e)}")
+        print(f"Batch complete: {sent}/{len(self.roster)} digests queued in {time.monotonic() - started:.1f}s "
+              f"({shared.misses} shared fetches, {shared.hits} reused)")
+        return sent
+
+def stats_window(args):
+    """(since, until, label) for `stats [DAYS | FROM [TO]]`; dates are
+    YYYY-MM-DD, local time, TO inclusive."""
+    now = time.time()
+    if not args:
+        return now - 7 * 86400, now, "the last 7 days"
+    try:
+        days = float(args[0])
+        return now - days * 86400, now, f"the last {days:g} days"
+    except ValueError:
+        pass
+    start = datetime.strptime(args[0], '%Y-%m-%d')
+    end = datetime.strptime(args[1], '%Y-%m-%d') if len(args) > 1 else start
+    return start.timestamp(), (end + timedelta(days=1)).timestamp(), f"{args[0]} to {end.strftime('%Y-%m-%d')}"
+
+def print_stats(db, args):
+    """Print p50/p95/p99 latency per recorded stage, then which path
+    (Gemini or the template) composed each digest and why."""
+    since, until, label = stats_window(args)
+    summary = tracing.summarize(db.get_span_durations(since, until))
+    outcomes = db.get_generation_outcomes(since, until)
+    if not summary and not outcomes:
+        print(f"No runs recorded for {label}")
+        return
+    if summary:
+        print(f"\nStage latency for {label} (ms):")
+        print(f"{'stage':<36} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+        for kind, name, count, p50, p95, p99, worst in summary:
+            stage = f"{kind}/{name}" if kind else name
+            print(f"{stage:<36} {count:>6} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {worst:>9.1f}")
+    if outcomes:
+        print(f"\nDigest composed by, for {label}:")
+        print(f"{'path':<36} {'count':>6} {'avg ms':>9}")
+        for winner, reason, count, latency in outcomes:
+            print(f"{f'{winner} ({reason})':<36} {count:>6} {latency or 0:>9}")
+
+def start_scheduler(digest):
+    """Schedule the digest (and its prefetch) plus one send per roster user
+    at their own send_time and timezone, and start dispatching."""
+    timezone = os.getenv('DIGEST_TIMEZONE') or None
+    roster_path = os.getenv('ROSTER_PATH')
+    roster = load_roster(roster_path) if roster_path and os.path.exists(roster_path) else []
+    users = {user['email']: user for user in roster}
+
+    def send_user_digests(payloads):
+        # Users due at the same moment share one batch, and so its fetches
+        batch = []
+        for payload in payloads:
+            user = users.get(payload['email'])
+            if user is None:
+                print(f"No roster entry for {payload['email']}; skipping their digest")
+                continue
+            batch.append(user)
+        if batch:
+            BatchDigest(digest, batch).run()
+
+    scheduler = Scheduler(digest.db, {
+        'prefetch': lambda payload: digest.prefetch(),
+        'digest': lambda payload: digest.generate_digest(),
+        'user_digest': send_user_digests,
+    }, batch_kinds=('user_digest',))
+    scheduler.set_jobs('digest', [{'name': 'digest', 'time': SEND_TIME, 'timezone': timezone}])
+    prefetch_jobs = []
+    if digest.prefetch_lead > 0:
+        prefetch_at = datetime.strptime(SEND_TIME, '%H:%M') - timedelta(minutes=digest.prefetch_lead)
+        prefetch_jobs.append({
+            'name': 'prefetch',
+            'time': prefetch_at.strftime('%H:%M:%S'),
+            'timezone': timezone,
+            # A prefetch is only worth catching up on before its send
+            'catch_up': digest.prefetch_lead * 60,
+        })
+    scheduler.set_jobs('prefetch', prefetch_jobs)
+    scheduler.set_jobs('user_digest', [
+        {
+            'name': f"user_digest:{email}",
+            'time': user.get('send_time', SEND_TIME),
+            'timezone': user.get('timezone') or timezone,
+            'payload': {'email': email},
+        }
+        for email, user in users.items()
+    ])
+    scheduler.start()
+    for name, next_run in scheduler.next_runs():
+        print(f"Next run of {name}: {datetime.fromtimestamp(next_run)}")
+    return scheduler
+
 def main():
     digest = MorningDigest()
     
+    # Stats mode: per-stage latency from recorded runs, then exit
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print_stats(digest.db, sys.argv[2:])
+        return
+    
+    # Batch mode: one digest per roster entry, then exit
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        roster_path = sys.argv[2] if len(sys.argv) > 2 else os.getenv('ROSTER_PATH', 'roster.json')
+        print(f"\nSending batch digests for roster {roster_path}...")
+        BatchDigest(digest, load_roster(roster_path)).run()
+        if not digest.email.flush():
+            print("Some digests were still undelivered when the wait ran out")
+        return
+    
     # Start the email listener service
     digest.email_listener.start()
     print("Email listener service started...")
+    print(f"Ready in {time.perf_counter() - STARTUP_BEGAN:.2f}s")
     
     # Check for immediate send argument
     if len(sys.argv) > 1 and sys.argv[1] == "send":
         print("\nSending digest immediately...")
         digest.generate_digest()
+        if not digest.email.flush():
+            print("The digest was still undelivered when the wait ran out")
+        digest.startup_report()
         return
     
     # Run in test mode (print to console)
     if os.getenv('EMAIL_TEST_MODE', 'true').lower() == 'true':
         print("\nRunning test digest (preview mode)...")
         digest.generate_digest()
+        digest.startup_report()
         return
     
-    # Regular scheduled mode
-    schedule.every().day.at("07:00").do(digest.generate_digest)
+    # Build everything now, in parallel, so the first digest doesn't pay for it
+    digest.warm_up()
+    digest.startup_report()
+    
+    # Regular scheduled mode: prefetch ahead of the send so it goes out on time
+    scheduler = start_scheduler(digest)
     print("Morning Digest Assistant is running...")
-    print("Scheduled to send digest every day at 7:00 AM")
+    print(f"Scheduled to send digest every day at {SEND_TIME}")
     print("Email listener is active - waiting for incoming messages")
     print("(Use 'python main.py send' to send immediately)")
     
     try:
         while True:
-            schedule.run_pending()
-            time.sleep(60)
+            # The scheduler and listener run on their own threads
+            time.sleep(3600)
     except KeyboardInterrupt:
         print("\nShutting down services...")
+        scheduler.stop()
         digest.email_listener.stop()
         print("Goodbye!")
         sys.exit(0)
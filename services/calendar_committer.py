@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from services.lazy import resolve
+
+class CalendarCommitter:
+    """Background writer for pending calendar_events rows.
+
+    Requests are stored as 'pending' rows and the committer is woken with
+    submit(). It waits CALENDAR_COMMIT_LINGER seconds so rows from emails
+    arriving together share a round-trip, then sends up to
+    CALENDAR_COMMIT_BATCH rows in one Calendar API batch request and records
+    every outcome in a single transaction. Rows that hit a transient error
+    stay pending and are retried after CALENDAR_COMMIT_RETRY seconds; rows
+    left pending by an earlier run are picked up on start.
+    """
+
+    def __init__(self, calendar_service, database_service):
+        # May be a LazyService; the calendar is only built once there's work
+        self._calendar = calendar_service
+        self.db = database_service
+        self.linger = float(os.getenv('CALENDAR_COMMIT_LINGER', '0.5'))
+        self.batch_size = min(50, int(os.getenv('CALENDAR_COMMIT_BATCH', '50')))
+        self.retry_delay = float(os.getenv('CALENDAR_COMMIT_RETRY', '60'))
+
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._cond = threading.Condition()
+        self._results = {}
+        self._awaited = set()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self._stop_event.clear()
+            self._wake.set()
+            self.thread = threading.Thread(target=self._run, name='calendar-committer', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, event_ids=()):
+        """Signal that new pending rows are waiting; pass their ids to wait() on them."""
+        with self._cond:
+            self._awaited.update(event_ids)
+        self._wake.set()
+
+    def wait(self, event_ids, timeout):
+        """Wait up to timeout seconds for rows to be committed.
+
+        Returns {event_id: (status, detail)} for the rows that finished;
+        detail is the Google event id or the error message.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                done = {event_id: self._results[event_id] for event_id in event_ids if event_id in self._results}
+                remaining = deadline - time.monotonic()
+                if len(done) == len(event_ids) or remaining <= 0:
+                    for event_id in event_ids:
+                        self._results.pop(event_id, None)
+                        self._awaited.discard(event_id)
+                    return done
+                self._cond.wait(remaining)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.retry_delay)
+            if self._stop_event.is_set():
+                return
+            self._wake.clear()
+            # Give emails arriving together a moment to land in the same batch
+            self._stop_event.wait(self.linger)
+            try:
+                while self._commit_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Calendar committer error: {str(e)}")
+
+    def _commit_batch(self):
+        """Commit one batch of pending rows; returns how many were settled."""
+        rows = self.db.get_pending_calendar_events(limit=self.batch_size)
+        if not rows:
+            return 0
+
+        events = {
+            row[0]: {'title': row[2], 'description': row[3], 'start_time': row[4], 'end_time': row[5]}
+            for row in rows
+        }
+        results = resolve(self._calendar).add_events(events)
+
+        updates = []
+        finished = {}
+        for event_id, (google_id, error, transient) in results.items():
+            if error is None:
+                updates.append(('added', google_id, event_id))
+                finished[event_id] = ('added', google_id)
+            elif not transient:
+                updates.append(('failed', None, event_id))
+                finished[event_id] = ('failed', error)
+        self.db.update_calendar_event_statuses(updates)
+
+        added = sum(1 for status, _, _ in updates if status == 'added')
+        print(f"Calendar commit: {added} added, {len(updates) - added} failed, "
+              f"{len(rows) - len(updates)} left for retry")
+        with self._cond:
+            self._results.update(
+                (event_id, result) for event_id, result in finished.items() if event_id in self._awaited
+            )
+            self._cond.notify_all()
+        return len(updates)
@@ -1,18 +1,63 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+# The Google client libraries are imported where they're used; they're slow
+# to import and most runs only need the local copy of the events
+from datetime import datetime, timedelta, timezone
 import os
-import pickle
+import time
+import threading
+from services.google_credentials import get_credential_manager
+
+UTC_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+def _to_utc(when):
+    """Normalize an event start/end ({'dateTime': ...} or {'date': ...}) to a
+    sortable UTC string. All-day dates are taken as local midnight."""
+    value = when.get('dateTime') or when.get('date')
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed.astimezone(timezone.utc).strftime(UTC_FORMAT)
+
+def _event_row(event):
+    return {
+        'id': event['id'],
+        'summary': event.get('summary', '(No title)'),
+        'start_raw': event['start'].get('dateTime', event['start'].get('date')),
+        'end_raw': event['end'].get('dateTime', event['end'].get('date')),
+        'start_utc': _to_utc(event['start']),
+        'end_utc': _to_utc(event['end']),
+        'all_day': 'dateTime' not in event['start'],
+        'updated': event.get('updated'),
+    }
 
 class GoogleCalendarService:
-    def __init__(self):
-        self.SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+    """Google Calendar access backed by a local copy of the user's events.
+
+    With a database, events are pulled incrementally with Calendar sync
+    tokens into calendar_event_cache, at most every CALENDAR_SYNC_INTERVAL
+    seconds; reads are answered from that table. The API client is built
+    once from the discovery document bundled with google-api-python-client
+    and reused; one lock serializes API calls because the client's HTTP
+    transport isn't thread-safe.
+    """
+
+    def __init__(self, token_path='token.pickle', credentials_path=None, interactive=True, db=None):
+        # calendar.events allows reading events and adding the ones requested by email
+        self.SCOPES = ['https://www.googleapis.com/auth/calendar.events']
         self.creds = None
         self.is_configured = False
+        self.token_path = token_path
+        self.credentials_path = credentials_path or os.getenv('GOOGLE_CALENDAR_CREDENTIALS')
+        # Batch runs can't open a browser for the OAuth consent screen
+        self.interactive = interactive
+        self.db = db
+        # Local events are trusted for this long before pulling changes
+        self.sync_interval = int(os.getenv('CALENDAR_SYNC_INTERVAL', '300'))
+        # How far back the first full sync reaches
+        self.sync_past_days = int(os.getenv('CALENDAR_SYNC_PAST_DAYS', '30'))
+        self.calendar_ids = [c.strip() for c in os.getenv('CALENDAR_IDS', 'primary').split(',') if c.strip()]
+        self._client = None
+        self._lock = threading.RLock()
         
         # Only try to authenticate if credentials file is provided
-        if os.getenv('GOOGLE_CALENDAR_CREDENTIALS'):
+        if self.credentials_path:
             try:
                 self._authenticate()
                 self.is_configured = True
@@ -20,25 +65,165 @@ class GoogleCalendarService:
                 print(f"Calendar setup failed: {str(e)}")
 
     def _authenticate(self):
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                self.creds = pickle.load(token)
+        # Shared with every other client of this token file; refreshed in the background
+        self.creds = get_credential_manager().credentials(
+            self.token_path,
+            self.SCOPES,
+            self.credentials_path,
+            self.interactive
+        )
+
+    def _service(self):
+        """The Calendar API client, built on first use."""
+        with self._lock:
+            if self._client is None:
+                from googleapiclient.discovery import build
+                # static_discovery uses the bundled discovery document instead of fetching it
+                self._client = build('calendar', 'v3', credentials=self.creds,
+                                     static_discovery=True, cache_discovery=False)
+            return self._client
+
+    def _sync_calendar(self, calendar_id):
+        """Pull changes since the last sync (or everything, the first time)."""
+        from googleapiclient.errors import HttpError
+        state = self.db.get_calendar_sync_state(self.token_path, calendar_id)
+        sync_token = state[0] if state else None
+        full = sync_token is None
+        params = {'calendarId': calendar_id, 'singleEvents': True, 'maxResults': 250}
+        if full:
+            since = datetime.now(timezone.utc) - timedelta(days=self.sync_past_days)
+            params['timeMin'] = since.strftime(UTC_FORMAT)
+        else:
+            params['syncToken'] = sync_token
+            params['showDeleted'] = True
+
+        events, deleted = [], []
+        synced_at = time.time()
+        try:
+            page_token = None
+            while True:
+                result = self._service().events().list(pageToken=page_token, **params).execute()
+                for event in result.get('items', []):
+                    if event.get('status') == 'cancelled':
+                        deleted.append(event['id'])
+                    else:
+                        events.append(_event_row(event))
+                page_token = result.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as e:
+            if e.resp.status == 410 and not full:
+                # Sync token expired; start over with a full sync
+                self.db.apply_calendar_changes(self.token_path, calendar_id, [], [], None, 0, full=True)
+                return self._sync_calendar(calendar_id)
+            raise
+
+        self.db.apply_calendar_changes(
+            self.token_path, calendar_id, events, deleted, result.get('nextSyncToken'), synced_at, full=full
+        )
+        return len(events) + len(deleted)
+
+    def sync(self, force=False):
+        """Bring the local copy up to date if it's older than the sync interval."""
+        with self._lock:
+            changed = 0
+            for calendar_id in self.calendar_ids:
+                state = self.db.get_calendar_sync_state(self.token_path, calendar_id)
+                if not force and state and state[0] and time.time() - state[1] < self.sync_interval:
+                    continue
+                changed += self._sync_calendar(calendar_id)
+            return changed
+
+    def get_event_list(self, start_date, end_date):
+        """Events overlapping [start_date, end_date), earliest first, as dicts
+        with summary, start_raw/end_raw (as Google returned them) and all_day.
+        Naive datetimes are taken as local time."""
+        if not self.is_configured:
+            return []
+        start_utc = start_date.astimezone(timezone.utc).strftime(UTC_FORMAT)
+        end_utc = end_date.astimezone(timezone.utc).strftime(UTC_FORMAT)
+
+        if self.db:
+            try:
+                self.sync()
+            except Exception as e:
+                # Serve what was mirrored by the last successful sync
+                print(f"Calendar sync failed, using cached events: {str(e)}")
+            return self.db.get_calendar_events(self.token_path, self.calendar_ids, start_utc, end_utc)
+
+        events = []
+        with self._lock:
+            for calendar_id in self.calendar_ids:
+                result = self._service().events().list(
+                    calendarId=calendar_id,
+                    timeMin=start_utc,
+                    timeMax=end_utc,
+                    singleEvents=True,
+                    orderBy='startTime'
+                ).execute()
+                events.extend(_event_row(event) for event in result.get('items', []))
+        return sorted(events, key=lambda event: event['start_utc'])
+
+    def _event_body(self, title, description, start_time, end_time):
+        def rfc3339(value):
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            # Naive times are the user's local time
+            return value.astimezone().isoformat()
+        return {
+            'summary': title,
+            'description': description or '',
+            'start': {'dateTime': rfc3339(start_time)},
+            'end': {'dateTime': rfc3339(end_time)},
+        }
+
+    def add_event(self, title, description, start_time, end_time, calendar_id='primary'):
+        """Insert one event and return its Google event id."""
+        if not self.is_configured:
+            raise RuntimeError("Calendar not configured")
+        body = self._event_body(title, description, start_time, end_time)
+        with self._lock:
+            created = self._service().events().insert(calendarId=calendar_id, body=body).execute()
+        return created['id']
+
+    def add_events(self, events, calendar_id='primary'):
+        """Insert several events with one batch request.
 
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
+        events maps a caller's key to a dict of add_event's arguments.
+        Returns {key: (google_event_id, error, transient)}; error is None on
+        success and transient marks failures worth retrying (rate limits,
+        server errors).
+        """
+        if not self.is_configured:
+            return {key: (None, "Calendar not configured", False) for key in events}
+
+        results = {}
+        keys = {str(i): key for i, key in enumerate(events)}
+
+        def on_response(request_id, response, exception):
+            key = keys[request_id]
+            if exception is None:
+                results[key] = (response['id'], None, False)
             else:
-                creds_path = os.getenv('GOOGLE_CALENDAR_CREDENTIALS')
-                if not os.path.exists(creds_path):
-                    raise FileNotFoundError(f"Credentials file not found at: {creds_path}")
-                    
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    creds_path,
-                    self.SCOPES
-                )
-                self.creds = flow.run_local_server(port=0)
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(self.creds, token)
+                status = getattr(getattr(exception, 'resp', None), 'status', None)
+                transient = status is None or status == 429 or status >= 500
+                results[key] = (None, str(exception), transient)
+
+        with self._lock:
+            service = self._service()
+            batch = service.new_batch_http_request(callback=on_response)
+            for request_id, key in keys.items():
+                event = events[key]
+                body = self._event_body(event['title'], event['description'], event['start_time'], event['end_time'])
+                batch.add(service.events().insert(calendarId=calendar_id, body=body), request_id=request_id)
+            batch.execute()
+        return results
+
+    def describe_event(self, event):
+        """Plain-text one-liner for an event, e.g. 'Mon, Oct 19 09:30 - Standup'."""
+        start = datetime.fromisoformat(event['start_raw'].replace('Z', '+00:00'))
+        when = start.strftime('%a, %b %d') + ('' if event['all_day'] else start.strftime(' %H:%M'))
+        return f"{when} - {event['summary']}"
 
     def get_events(self, start_date, end_date):
         if not self.is_configured:
@@ -50,24 +235,14 @@ class GoogleCalendarService:
             """
             
         try:
-            service = build('calendar', 'v3', credentials=self.creds)
-            events_result = service.events().list(
-                calendarId='primary',
-                timeMin=start_date.isoformat() + 'Z',
-                timeMax=end_date.isoformat() + 'Z',
-                maxResults=10,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            events = self.get_event_list(start_date, end_date)[:10]
             
             if not events:
                 return "<li>No upcoming events</li>"
                 
             formatted_events = []
             for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
+                start = event['start_raw']
                 time_str = start.split('T')[1][:5] if 'T' in start else 'All day'
                 formatted_events.append(
                     f"<li>{time_str} - {event['summary']}</li>"
@@ -76,4 +251,4 @@ class GoogleCalendarService:
             return "\n".join(formatted_events)
             
         except Exception as e:
-            return f"<li>Unable to fetch calendar events: {str(e)}</li>" 
\ No newline at end of file
+            return f"<li>Unable to fetch calendar events: {str(e)}</li>" 
@@ -1,33 +1,103 @@
-from canvasapi import Canvas
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+DUE_AT_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
 class CanvasService:
-    def __init__(self):
-        api_key = os.getenv('CANVAS_API_KEY')
+    def __init__(self, api_key=None, db=None):
+        # Batch runs pass each user's own token; never fall back to ours for them
+        if api_key is None:
+            api_key = os.getenv('CANVAS_API_KEY')
         # Thomas College Canvas URL
-        base_url = "https://thomas.instructure.com"
+        base_url = os.getenv('CANVAS_BASE_URL', "https://thomas.instructure.com")
         
         print("\nCanvas Service Debug:")
         print(f"API Key Length: {len(api_key) if api_key else 0}")
         print(f"Base URL: {base_url}")
         
+        self.db = db
+        # Seconds a local assignment sync is trusted before asking Canvas again
+        self.sync_interval = int(os.getenv('CANVAS_SYNC_INTERVAL', '900'))
+        self.max_workers = int(os.getenv('CANVAS_WORKERS', '6'))
         self.is_configured = False
         if not api_key:
             print("Canvas API key not configured")
             return
             
         try:
-            print("Attempting to connect to Canvas...")
+            from canvasapi import Canvas
             self.canvas = Canvas(base_url, api_key)
-            print("Canvas connection established")
-            print("Fetching user info...")
-            self.user = self.canvas.get_current_user()
-            print(f"Successfully connected as user: {self.user.name}")
+            self._user = None
+            self._user_lock = threading.Lock()
             self.is_configured = True
         except Exception as e:
             print(f"Canvas setup failed with error: {str(e)}")
-            print("Try generating a new token in Canvas Account Settings")
+
+    @property
+    def user(self):
+        """The token's Canvas user, looked up on first use rather than at startup."""
+        with self._user_lock:
+            if self._user is None:
+                try:
+                    print("Fetching Canvas user info...")
+                    self._user = self.canvas.get_current_user()
+                    print(f"Successfully connected as user: {self._user.name}")
+                except Exception as e:
+                    print(f"Canvas user lookup failed with error: {str(e)}")
+                    print("Try generating a new token in Canvas Account Settings")
+                    raise
+            return self._user
+
+    def _fetch_course(self, course):
+        """Fetch a course's not-yet-due assignments, letting Canvas do the filtering."""
+        assignments = course.get_assignments(bucket='future', order_by='due_at', per_page=100)
+        return [
+            {
+                'id': assignment.id,
+                'course': course.name,
+                'name': assignment.name,
+                'due_at': assignment.due_at,
+                'points': assignment.points_possible,
+                'url': assignment.html_url,
+                'updated_at': getattr(assignment, 'updated_at', None)
+            }
+            for assignment in assignments
+            if assignment.due_at
+        ]
+
+    def _fetch_all_courses(self):
+        """Fetch upcoming assignments for every active course in parallel.
+
+        Returns the active courses and a {course_id: assignments} map that
+        leaves out courses whose fetch failed.
+        """
+        courses = list(self.user.get_courses(enrollment_state='active'))
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [(course, pool.submit(self._fetch_course, course)) for course in courses]
+            for course, future in futures:
+                try:
+                    results[course.id] = future.result()
+                except Exception as e:
+                    print(f"Failed to fetch assignments for {getattr(course, 'name', course.id)}: {str(e)}")
+        return courses, results
+
+    def _sync_assignments(self):
+        """Refresh the local assignment table from Canvas."""
+        synced_at = time.time()
+        courses, results = self._fetch_all_courses()
+        changed = 0
+        for course in courses:
+            # A failed course keeps its old rows and sync time, so it's retried next run
+            if course.id in results:
+                changed += self.db.sync_canvas_course(
+                    self.user.id, course.id, course.name, results[course.id], synced_at
+                )
+        self.db.prune_canvas_courses(self.user.id, [course.id for course in courses])
+        print(f"Canvas sync: {len(results)}/{len(courses)} courses, {changed} assignments changed")
 
     def get_assignments(self):
         if not self.is_configured:
@@ -42,38 +112,45 @@ class CanvasService:
             today = datetime.now()
             next_week = today + timedelta(days=7)
             
-            # Get all active courses
-            courses = self.user.get_courses(enrollment_state='active')
+            if self.db:
+                last_sync = self.db.get_canvas_sync_time(self.user.id)
+                if last_sync is None or time.time() - last_sync > self.sync_interval:
+                    self._sync_assignments()
+                assignments = self.db.get_canvas_assignments(
+                    self.user.id,
+                    today.strftime(DUE_AT_FORMAT),
+                    next_week.strftime(DUE_AT_FORMAT)
+                )
+            else:
+                assignments = [
+                    assignment
+                    for course_assignments in self._fetch_all_courses()[1].values()
+                    for assignment in course_assignments
+                ]
             
-            upcoming_assignments = []
             due_today = []
             due_this_week = []
             
-            for course in courses:
-                assignments = course.get_assignments()
-                for assignment in assignments:
-                    if not assignment.due_at:
-                        continue
-                        
-                    due_date = datetime.strptime(assignment.due_at, "%Y-%m-%dT%H:%M:%SZ")
-                    
-                    # Skip past assignments
-                    if due_date < today:
-                        continue
-                        
-                    assignment_info = {
-                        'name': assignment.name,
-                        'course': course.name,
-                        'due_date': due_date,
-                        'points': assignment.points_possible,
-                        'url': assignment.html_url
-                    }
+            for assignment in assignments:
+                due_date = datetime.strptime(assignment['due_at'], DUE_AT_FORMAT)
+                
+                # Skip past assignments
+                if due_date < today:
+                    continue
                     
-                    # Categorize by due date
-                    if due_date.date() == today.date():
-                        due_today.append(assignment_info)
-                    elif due_date <= next_week:
-                        due_this_week.append(assignment_info)
+                assignment_info = {
+                    'name': assignment['name'],
+                    'course': assignment['course'],
+                    'due_date': due_date,
+                    'points': assignment['points'],
+                    'url': assignment['url']
+                }
+                
+                # Categorize by due date
+                if due_date.date() == today.date():
+                    due_today.append(assignment_info)
+                elif due_date <= next_week:
+                    due_this_week.append(assignment_info)
             
             # Sort by due date
             due_today.sort(key=lambda x: x['due_date'])
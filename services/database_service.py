@@ -1,110 +1,352 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 import json
+import math
+import os
+import queue
+import threading
+import atexit
+from contextlib import contextmanager
+from services.db_migrations import MIGRATIONS
+from services.section_store import SECTION_COLUMNS, store_section, release_sections, load_sections
+
+# daily_digests columns holding section keys, in section order
+_SECTION_KEYS = ', '.join(stored for stored, _ in SECTION_COLUMNS)
+
+# Applied to every pooled connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',
+)
 
 class DatabaseService:
+    """SQLite storage for digests, email interactions and service caches.
+
+    Connections are long-lived and pooled (WAL mode, so readers don't block
+    the writer); writes are serialized through one lock so the scheduler and
+    listener threads never race each other into SQLITE_BUSY. Interaction
+    logs are buffered and written in batched transactions.
+    """
+
     def __init__(self, db_path='data/morning_digest.db'):
         self.db_path = db_path
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', '4'))
+        self.batch_size = int(os.getenv('DB_BATCH_SIZE', '50'))
+        self.flush_interval = float(os.getenv('DB_FLUSH_INTERVAL', '2'))
+
+        self._pool = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._connections = []
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_writes = []
+        self._flush_timer = None
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         self.setup_database()
+        atexit.register(self.close)
+
+    def _open_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, opening a new one while under DB_POOL_SIZE."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                conn = None
+                if len(self._connections) < self.pool_size:
+                    conn = self._open_connection()
+                    self._connections.append(conn)
+            if conn is None:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed writes as one transaction, committing on success."""
+        with self._connection() as conn, self._write_lock:
+            with conn:
+                yield conn.cursor()
+
+    def _queue_write(self, sql, params):
+        """Buffer a write that doesn't need to be visible immediately."""
+        with self._pending_lock:
+            self._pending_writes.append((sql, params))
+            if len(self._pending_writes) >= self.batch_size:
+                flush_now = True
+            else:
+                flush_now = False
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered writes in a single transaction."""
+        with self._pending_lock:
+            pending, self._pending_writes = self._pending_writes, []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if not pending:
+            return
+        with self._transaction() as cursor:
+            for sql, params in pending:
+                cursor.execute(sql, params)
+
+    def close(self):
+        """Flush buffered writes and close every pooled connection."""
+        self.flush()
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._pool = queue.LifoQueue()
 
     def setup_database(self):
-        """Initialize the database with necessary tables."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Create tables
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_queries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    email_from TEXT,
-                    query TEXT,
-                    response TEXT
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS daily_digests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date DATE UNIQUE,
-                    health_data TEXT,
-                    calendar_events TEXT,
-                    weather_info TEXT,
-                    news_updates TEXT,
-                    assignments TEXT
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS calendar_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email_from TEXT,
-                    event_title TEXT,
-                    event_description TEXT,
-                    start_time DATETIME,
-                    end_time DATETIME,
-                    status TEXT DEFAULT 'pending',
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
+        """Bring the database schema up to the latest version."""
+        with self._connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        pending = [migration for migration in MIGRATIONS if migration[0] > version]
+        if not pending:
+            return
+        # The sqlite3 module doesn't open a transaction before DDL, so each
+        # CREATE/ALTER would commit on its own; with autocommit and an
+        # explicit BEGIN a migration's steps and version bump commit or roll
+        # back together
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            for migration_version, description, steps in pending:
+                with self._write_lock:
+                    cursor = conn.cursor()
+                    cursor.execute('BEGIN IMMEDIATE')
+                    try:
+                        for step in steps:
+                            if callable(step):
+                                step(cursor)
+                            else:
+                                cursor.execute(step)
+                        # PRAGMA can't take parameters; the version is always our own int
+                        cursor.execute(f'PRAGMA user_version = {int(migration_version)}')
+                        cursor.execute('COMMIT')
+                    except BaseException:
+                        cursor.execute('ROLLBACK')
+                        raise
+                print(f"Database migrated to version {migration_version}: {description}")
+        finally:
+            conn.close()
+
+    def store_digest(self, health_data, calendar_events, weather_info, news_updates, assignments, recipient=None):
+        """Store the daily digest information. Sections are kept once each in
+        the compressed section store; the digest row references them."""
+        sections = [health_data, calendar_events, weather_info, news_updates, assignments]
+        with self._transaction() as cursor:
+            today = datetime.now().date().isoformat()
+            # Resending today replaces the earlier digest and its references
+            cursor.execute(f'''
+                SELECT {_SECTION_KEYS} FROM daily_digests
+                WHERE date = ? AND recipient = ?
+            ''', (today, recipient or ''))
+            previous = cursor.fetchone()
+
+            keys = [store_section(cursor, json.dumps(section)) for section in sections]
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO daily_digests
+                (date, recipient, {_SECTION_KEYS})
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (today, recipient or '', *keys))
+            if previous:
+                release_sections(cursor, previous)
+
+    def _with_sections(self, conn, rows):
+        """Digest rows with section keys replaced by their (JSON) text:
+        (id, date, recipient, health_data, calendar_events, weather_info,
+        news_updates, assignments)."""
+        cursor = conn.cursor()
+        texts = load_sections(cursor, [key for row in rows for key in row[3:]])
+        return [row[:3] + tuple(texts.get(key) for key in row[3:]) for row in rows]
+
+    def store_query(self, email_from, query, response):
+        """Store a user query and its response (buffered; see flush)."""
+        # Stamp now rather than at flush time (same format as CURRENT_TIMESTAMP)
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._queue_write('''
+            INSERT INTO user_queries (timestamp, email_from, query, response)
+            VALUES (?, ?, ?, ?)
+        ''', (timestamp, email_from, query, response))
+
+    def record_generation_outcome(self, recipient, winner, reason, latency_ms):
+        """Record which path composed a digest: 'gemini' or 'template' (buffered)."""
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._queue_write('''
+            INSERT INTO digest_generation_outcomes (created_at, recipient, winner, reason, latency_ms)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (timestamp, recipient or '', winner, reason, latency_ms))
 
-    def store_digest(self, health_data, calendar_events, weather_info, news_updates, assignments):
-        """Store the daily digest information."""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_generation_outcomes(self, since, until):
+        """Count how often each path composed the digest in [since, until),
+        as epoch seconds, as (winner, reason, count, avg_latency_ms) rows."""
+        def utc(epoch):
+            return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+        # created_at has whole seconds; round outward so a digest composed
+        # this second still counts
+
+        self.flush()
+        with self._connection() as conn:
             cursor = conn.cursor()
-            today = datetime.now().date()
-            
             cursor.execute('''
-                INSERT OR REPLACE INTO daily_digests 
-                (date, health_data, calendar_events, weather_info, news_updates, assignments)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                today.isoformat(),
-                json.dumps(health_data),
-                json.dumps(calendar_events),
-                json.dumps(weather_info),
-                json.dumps(news_updates),
-                json.dumps(assignments)
-            ))
+                SELECT winner, reason, COUNT(*), CAST(AVG(latency_ms) AS INTEGER)
+                FROM digest_generation_outcomes
+                WHERE created_at >= ? AND created_at < ?
+                GROUP BY winner, reason
+                ORDER BY COUNT(*) DESC
+            ''', (utc(math.floor(since)), utc(math.ceil(until))))
+            return cursor.fetchall()
 
-    def store_query(self, email_from, query, response):
-        """Store a user query and its response."""
-        with sqlite3.connect(self.db_path) as conn:
+    def record_span(self, trace_id, kind, name, started_at, duration_ms, status, detail=None):
+        """Record one timed stage of a digest run or listener message (buffered)."""
+        self._queue_write('''
+            INSERT INTO spans (trace_id, kind, name, started_at, duration_ms, status, detail)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (trace_id, kind, name, started_at, duration_ms, status, detail))
+
+    def get_span_durations(self, since, until):
+        """(kind, name, duration_ms) for spans started in [since, until),
+        as epoch seconds, sorted for grouping."""
+        self.flush()
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO user_queries (email_from, query, response)
-                VALUES (?, ?, ?)
-            ''', (email_from, query, response))
+                SELECT COALESCE(kind, ''), name, duration_ms
+                FROM spans
+                WHERE started_at >= ? AND started_at < ?
+                ORDER BY kind, name, duration_ms
+            ''', (since, until))
+            return cursor.fetchall()
+
+    def prune_spans(self, before):
+        """Delete spans started before the given epoch time."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                DELETE FROM spans
+                WHERE started_at < ?
+            ''', (before,))
 
     def get_recent_digests(self, days=7):
         """Retrieve recent daily digests."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM daily_digests
+            cursor.execute(f'''
+                SELECT id, date, recipient, {_SECTION_KEYS} FROM daily_digests
                 ORDER BY date DESC
                 LIMIT ?
             ''', (days,))
-            return cursor.fetchall()
+            return self._with_sections(conn, cursor.fetchall())
+
+    def get_digests_page(self, limit=7, before=None, recipient=None):
+        """Retrieve one page of digests, newest first.
+
+        before is the cursor returned with the previous page. Returns
+        (rows, next_cursor); next_cursor is None after the last page.
+        """
+        conditions = []
+        params = []
+        if recipient is not None:
+            conditions.append('recipient = ?')
+            params.append(recipient)
+        if before is not None:
+            conditions.append('(date, id) < (?, ?)')
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, date, recipient, {_SECTION_KEYS} FROM daily_digests
+                {where}
+                ORDER BY date DESC, id DESC
+                LIMIT ?
+            ''', (*params, limit))
+            rows = self._with_sections(conn, cursor.fetchall())
+        next_cursor = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def iter_digests(self, page_size=50, recipient=None):
+        """Stream every stored digest, newest first, one page at a time."""
+        cursor = None
+        while True:
+            rows, cursor = self.get_digests_page(page_size, cursor, recipient)
+            yield from rows
+            if cursor is None:
+                return
 
-    def get_user_history(self, email):
-        """Retrieve query history for a specific user."""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_user_history(self, email, limit=None):
+        """Retrieve query history for a specific user (newest first)."""
+        self.flush()
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT timestamp, query, response 
+                SELECT timestamp, query, response
                 FROM user_queries
                 WHERE email_from = ?
-                ORDER BY timestamp DESC
-            ''', (email,))
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (email, -1 if limit is None else limit))
             return cursor.fetchall()
 
+    def get_user_history_page(self, email, limit=50, before=None):
+        """Retrieve one page of a user's query history, newest first.
+
+        before is the cursor returned with the previous page. Returns
+        (rows, next_cursor); next_cursor is None after the last page.
+        """
+        self.flush()
+        if before is None:
+            keyset = ''
+            params = (email, limit)
+        else:
+            keyset = 'AND (timestamp, id) < (?, ?)'
+            params = (email, *before, limit)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, timestamp, query, response
+                FROM user_queries
+                WHERE email_from = ? {keyset}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', params)
+            rows = cursor.fetchall()
+        next_cursor = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return [row[1:] for row in rows], next_cursor
+
+    def iter_user_history(self, email, page_size=100):
+        """Stream a user's whole query history, newest first, one page at a time."""
+        cursor = None
+        while True:
+            rows, cursor = self.get_user_history_page(email, page_size, cursor)
+            yield from rows
+            if cursor is None:
+                return
+
     def store_calendar_event(self, email_from, title, description, start_time, end_time):
         """Store a calendar event request."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._transaction() as cursor:
             cursor.execute('''
                 INSERT INTO calendar_events 
                 (email_from, event_title, event_description, start_time, end_time)
@@ -114,22 +356,402 @@ class DatabaseService:
 
     def update_calendar_event_status(self, event_id, status):
         """Update the status of a calendar event."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._transaction() as cursor:
             cursor.execute('''
                 UPDATE calendar_events
                 SET status = ?
                 WHERE id = ?
             ''', (status, event_id))
 
-    def get_pending_calendar_events(self):
-        """Get all pending calendar events."""
-        with sqlite3.connect(self.db_path) as conn:
+    def store_calendar_events(self, email_from, events):
+        """Store several calendar event requests (dicts with title, description,
+        start_time and end_time) in one transaction; returns their ids."""
+        with self._transaction() as cursor:
+            ids = []
+            for event in events:
+                cursor.execute('''
+                    INSERT INTO calendar_events
+                    (email_from, event_title, event_description, start_time, end_time)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (email_from, event['title'], event['description'], event['start_time'], event['end_time']))
+                ids.append(cursor.lastrowid)
+            return ids
+
+    def update_calendar_event_statuses(self, updates):
+        """Apply (status, google_event_id, event_id) updates in one transaction."""
+        if not updates:
+            return
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                UPDATE calendar_events
+                SET status = ?, google_event_id = ?
+                WHERE id = ?
+            ''', updates)
+
+    def get_pending_calendar_events(self, limit=None):
+        """Get pending calendar events, oldest first."""
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id, email_from, event_title, event_description, start_time, end_time
                 FROM calendar_events
                 WHERE status = 'pending'
-                ORDER BY created_at ASC
+                ORDER BY created_at ASC, id ASC
+                LIMIT ?
+            ''', (-1 if limit is None else limit,))
+            return cursor.fetchall()
+
+    def get_cached_response(self, cache_key):
+        """Get a cached upstream response, or None if there isn't one."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT body, etag, last_modified, fetched_at
+                FROM http_cache
+                WHERE cache_key = ?
+            ''', (cache_key,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'body': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def store_cached_response(self, cache_key, url, body, etag, last_modified, fetched_at):
+        """Store (or replace) a cached upstream response."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO http_cache
+                (cache_key, url, body, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (cache_key, url, body, etag, last_modified, fetched_at))
+
+    def touch_cached_response(self, cache_key, fetched_at):
+        """Mark a cached response as fresh after the upstream revalidated it."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE http_cache
+                SET fetched_at = ?
+                WHERE cache_key = ?
+            ''', (fetched_at, cache_key))
+
+    def get_cached_generation(self, cache_key, created_after, now):
+        """Get a cached model response newer than created_after (or None),
+        counting the hit."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE generation_cache
+                SET last_used = ?, hits = hits + 1
+                WHERE cache_key = ? AND created_at > ?
+            ''', (now, cache_key, created_after))
+            if not cursor.rowcount:
+                return None
+            cursor.execute('''
+                SELECT response FROM generation_cache
+                WHERE cache_key = ?
+            ''', (cache_key,))
+            return cursor.fetchone()[0]
+
+    def store_cached_generation(self, cache_key, model, response, now, created_after, max_bytes):
+        """Store a model response, then evict expired entries and the least
+        recently used ones beyond max_bytes."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO generation_cache
+                (cache_key, model, response, size, created_at, last_used, hits)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', (cache_key, model, response, len(response.encode('utf-8')), now, now))
+            cursor.execute('''
+                DELETE FROM generation_cache
+                WHERE created_at <= ?
+            ''', (created_after,))
+            cursor.execute('''
+                DELETE FROM generation_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key, SUM(size) OVER (ORDER BY last_used DESC, cache_key) AS running
+                        FROM generation_cache
+                    )
+                    WHERE running > ?
+                )
+            ''', (max_bytes,))
+
+    def get_generation_cache_stats(self):
+        """Entry count, total bytes and lifetime hits of the generation cache."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0)
+                FROM generation_cache
+            ''')
+            entries, size, hits = cursor.fetchone()
+            return {'entries': entries, 'bytes': size, 'hits': hits}
+
+    def get_canvas_sync_time(self, user_id):
+        """Get when the least recently synced course of a Canvas user was synced."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT MIN(synced_at) FROM canvas_course_sync
+                WHERE user_id = ?
+            ''', (user_id,))
+            return cursor.fetchone()[0]
+
+    def sync_canvas_course(self, user_id, course_id, course_name, assignments, synced_at):
+        """Bring the local copy of one course's upcoming assignments up to date.
+
+        Only rows whose Canvas updated_at changed are rewritten; assignments no
+        longer returned by Canvas are removed. Returns the number of rows changed.
+        """
+        with self._transaction() as cursor:
+            cursor.execute('''
+                SELECT assignment_id, updated_at FROM canvas_assignments
+                WHERE user_id = ? AND course_id = ?
+            ''', (user_id, course_id))
+            existing = dict(cursor.fetchall())
+
+            changed = [a for a in assignments if existing.get(a['id'], object()) != a['updated_at']]
+            cursor.executemany('''
+                INSERT OR REPLACE INTO canvas_assignments
+                (user_id, assignment_id, course_id, course_name, name, due_at, points, url, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (user_id, a['id'], course_id, course_name, a['name'], a['due_at'],
+                 a['points'], a['url'], a['updated_at'])
+                for a in changed
+            ])
+
+            removed = set(existing) - {a['id'] for a in assignments}
+            cursor.executemany('''
+                DELETE FROM canvas_assignments
+                WHERE user_id = ? AND assignment_id = ?
+            ''', [(user_id, assignment_id) for assignment_id in removed])
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO canvas_course_sync (user_id, course_id, course_name, synced_at)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, course_id, course_name, synced_at))
+            return len(changed) + len(removed)
+
+    def prune_canvas_courses(self, user_id, active_course_ids):
+        """Drop local assignments for courses the user is no longer enrolled in."""
+        with self._transaction() as cursor:
+            placeholders = ','.join('?' * len(active_course_ids)) or 'NULL'
+            for table in ('canvas_assignments', 'canvas_course_sync'):
+                cursor.execute(f'''
+                    DELETE FROM {table}
+                    WHERE user_id = ? AND course_id NOT IN ({placeholders})
+                ''', (user_id, *active_course_ids))
+
+    def get_canvas_assignments(self, user_id, due_after, due_before):
+        """Get locally synced assignments due within [due_after, due_before]."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT assignment_id, course_name, name, due_at, points, url, updated_at
+                FROM canvas_assignments
+                WHERE user_id = ? AND due_at >= ? AND due_at <= ?
+                ORDER BY due_at ASC
+            ''', (user_id, due_after, due_before))
+            return [
+                {'id': row[0], 'course': row[1], 'name': row[2], 'due_at': row[3],
+                 'points': row[4], 'url': row[5], 'updated_at': row[6]}
+                for row in cursor.fetchall()
+            ]
+
+    def get_calendar_sync_state(self, account, calendar_id):
+        """Get (sync_token, synced_at) for a synced calendar, or None."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT sync_token, synced_at FROM calendar_sync_state
+                WHERE account = ? AND calendar_id = ?
+            ''', (account, calendar_id))
+            return cursor.fetchone()
+
+    def apply_calendar_changes(self, account, calendar_id, events, deleted_ids, sync_token, synced_at, full=False):
+        """Apply one sync's worth of event changes and store the next sync token.
+
+        A full sync replaces every stored event of the calendar.
+        """
+        with self._transaction() as cursor:
+            if full:
+                cursor.execute('''
+                    DELETE FROM calendar_event_cache
+                    WHERE account = ? AND calendar_id = ?
+                ''', (account, calendar_id))
+            cursor.executemany('''
+                INSERT OR REPLACE INTO calendar_event_cache
+                (account, calendar_id, event_id, summary, start_raw, end_raw, start_utc, end_utc, all_day, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (account, calendar_id, e['id'], e['summary'], e['start_raw'], e['end_raw'],
+                 e['start_utc'], e['end_utc'], int(e['all_day']), e['updated'])
+                for e in events
+            ])
+            cursor.executemany('''
+                DELETE FROM calendar_event_cache
+                WHERE account = ? AND calendar_id = ? AND event_id = ?
+            ''', [(account, calendar_id, event_id) for event_id in deleted_ids])
+            cursor.execute('''
+                INSERT OR REPLACE INTO calendar_sync_state (account, calendar_id, sync_token, synced_at)
+                VALUES (?, ?, ?, ?)
+            ''', (account, calendar_id, sync_token, synced_at))
+
+    def get_calendar_events(self, account, calendar_ids, start_utc, end_utc):
+        """Get locally synced events overlapping [start_utc, end_utc), earliest first."""
+        placeholders = ','.join('?' * len(calendar_ids))
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT event_id, calendar_id, summary, start_raw, end_raw, start_utc, end_utc, all_day
+                FROM calendar_event_cache
+                WHERE account = ? AND calendar_id IN ({placeholders})
+                AND start_utc < ? AND end_utc > ?
+                ORDER BY start_utc ASC
+            ''', (account, *calendar_ids, end_utc, start_utc))
+            return [
+                {'id': row[0], 'calendar_id': row[1], 'summary': row[2], 'start_raw': row[3],
+                 'end_raw': row[4], 'start_utc': row[5], 'end_utc': row[6], 'all_day': bool(row[7])}
+                for row in cursor.fetchall()
+            ]
+
+    def get_health_export_cache(self, path, mtime, size):
+        """Get the cached metrics parsed from an export file, if it hasn't changed."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT metrics FROM health_export_cache
+                WHERE path = ? AND mtime = ? AND size = ?
+            ''', (path, mtime, size))
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row else None
+
+    def store_health_export_cache(self, path, mtime, size, metrics):
+        """Cache the metrics parsed from an export file."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO health_export_cache (path, mtime, size, metrics)
+                VALUES (?, ?, ?, ?)
+            ''', (path, mtime, size, json.dumps(metrics)))
+
+    def get_ingested_health_files(self, source):
+        """Get {path: (mtime, size)} for export files already loaded into health_samples."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT path, mtime, size FROM health_ingested_files
+                WHERE source = ?
+            ''', (source,))
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def store_health_samples(self, source, path, mtime, size, samples):
+        """Load one export file's (metric, ts, day, qty) samples, replacing any
+        earlier samples with the same timestamp."""
+        # Parse before taking the write lock
+        samples = list(samples)
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO health_samples (source, metric, ts, day, qty)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ((source, *sample) for sample in samples))
+            cursor.execute('''
+                INSERT OR REPLACE INTO health_ingested_files (path, source, mtime, size)
+                VALUES (?, ?, ?, ?)
+            ''', (path, source, mtime, size))
+
+    def get_health_trends(self, source, metric, today):
+        """Daily-total trends for a metric as of today (YYYY-MM-DD).
+
+        Returns a dict with the 7-day average, the average of the 7 days before
+        that, the 30-day average and the best day ever, or None without data.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH daily AS (
+                    SELECT day, SUM(qty) AS total
+                    FROM health_samples
+                    WHERE source = :source AND metric = :metric
+                    GROUP BY day
+                )
+                SELECT
+                    AVG(CASE WHEN day > date(:today, '-7 days') THEN total END),
+                    AVG(CASE WHEN day > date(:today, '-14 days')
+                             AND day <= date(:today, '-7 days') THEN total END),
+                    AVG(CASE WHEN day > date(:today, '-30 days') THEN total END),
+                    MAX(total),
+                    (SELECT day FROM daily ORDER BY total DESC, day DESC LIMIT 1)
+                FROM daily
+            ''', {'source': source, 'metric': metric, 'today': today})
+            row = cursor.fetchone()
+            if row[3] is None:
+                return None
+            return {'avg_7': row[0], 'prev_7': row[1], 'avg_30': row[2], 'best': row[3], 'best_day': row[4]}
+
+    def get_imap_state(self, account, mailbox):
+        """Get (uidvalidity, last_uid) for a mailbox, or None if never synced."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT uidvalidity, last_uid FROM imap_state
+                WHERE account = ? AND mailbox = ?
+            ''', (account, mailbox))
+            return cursor.fetchone()
+
+    def set_imap_state(self, account, mailbox, uidvalidity, last_uid):
+        """Record the last processed UID for a mailbox."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO imap_state (account, mailbox, uidvalidity, last_uid)
+                VALUES (?, ?, ?, ?)
+            ''', (account, mailbox, uidvalidity, last_uid))
+
+    def get_scheduled_jobs(self):
+        """Every persisted scheduler job as a dict (payload decoded)."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT name, kind, time_of_day, timezone, payload, catch_up, next_run, last_run
+                FROM scheduled_jobs
             ''')
-            return cursor.fetchall() 
\ No newline at end of file
+            return [
+                {
+                    'name': row[0],
+                    'kind': row[1],
+                    'time_of_day': row[2],
+                    'timezone': row[3],
+                    'payload': json.loads(row[4]) if row[4] else None,
+                    'catch_up': row[5],
+                    'next_run': row[6],
+                    'last_run': row[7],
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def store_scheduled_jobs(self, jobs):
+        """Insert or update scheduler jobs (dicts as from get_scheduled_jobs)."""
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO scheduled_jobs
+                (name, kind, time_of_day, timezone, payload, catch_up, next_run, last_run)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (job['name'], job['kind'], job['time_of_day'], job['timezone'],
+                 json.dumps(job['payload']) if job['payload'] is not None else None,
+                 job['catch_up'], job['next_run'], job['last_run'])
+                for job in jobs
+            ])
+
+    def delete_scheduled_jobs(self, names):
+        """Remove scheduler jobs by name."""
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                DELETE FROM scheduled_jobs WHERE name = ?
+            ''', [(name,) for name in names])
+
+    def update_scheduled_job_run(self, name, last_run, next_run):
+        """Record that a job ran and when it's next due."""
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE scheduled_jobs SET last_run = ?, next_run = ?
+                WHERE name = ?
+            ''', (last_run, next_run, name))
@@ -0,0 +1,314 @@
+# Versioned schema for DatabaseService.
+#
+# Each migration is (version, description, steps); a step is either a SQL
+# statement or a callable taking a cursor. The applied version is kept in
+# SQLite's PRAGMA user_version and every migration runs in its own
+# transaction. Databases created before migrations existed are at version 0,
+# which is why the early steps use IF NOT EXISTS.
+
+import re
+from services.section_store import SECTION_COLUMNS, store_section
+
+_SECTION_KEY = re.compile(r'[0-9a-f]{64}')
+
+def _add_digest_recipient(cursor):
+    """Rebuild an older daily_digests table (one row per date) so each
+    recipient gets their own row per date."""
+    cursor.execute("PRAGMA table_info(daily_digests)")
+    if 'recipient' in [row[1] for row in cursor.fetchall()]:
+        return
+    cursor.execute("ALTER TABLE daily_digests RENAME TO daily_digests_old")
+    cursor.execute('''
+        CREATE TABLE daily_digests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE,
+            recipient TEXT NOT NULL DEFAULT '',
+            health_data TEXT,
+            calendar_events TEXT,
+            weather_info TEXT,
+            news_updates TEXT,
+            assignments TEXT,
+            UNIQUE (date, recipient)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO daily_digests
+        (id, date, health_data, calendar_events, weather_info, news_updates, assignments)
+        SELECT id, date, health_data, calendar_events, weather_info, news_updates, assignments
+        FROM daily_digests_old
+    ''')
+    cursor.execute("DROP TABLE daily_digests_old")
+
+def _content_address_digests(cursor):
+    """Move digest section text into the compressed, deduplicated
+    digest_sections store, leaving keys in daily_digests."""
+    # Safe to re-run: columns already renamed are left alone, and so are
+    # values that are already keys (JSON text never looks like one)
+    cursor.execute("PRAGMA table_info(daily_digests)")
+    existing = [row[1] for row in cursor.fetchall()]
+    for stored, original in SECTION_COLUMNS:
+        if stored not in existing:
+            cursor.execute(f"ALTER TABLE daily_digests RENAME COLUMN {original} TO {stored}")
+    columns = ', '.join(stored for stored, _ in SECTION_COLUMNS)
+    assignments = ', '.join(f"{stored} = ?" for stored, _ in SECTION_COLUMNS)
+    last_id, converted = 0, 0
+    while True:
+        cursor.execute(f'''
+            SELECT id, {columns} FROM daily_digests
+            WHERE id > ?
+            ORDER BY id
+            LIMIT 500
+        ''', (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for row in rows:
+            keys = [text if _SECTION_KEY.fullmatch(text or '') else store_section(cursor, text)
+                    for text in row[1:]]
+            cursor.execute(f"UPDATE daily_digests SET {assignments} WHERE id = ?", (*keys, row[0]))
+        last_id = rows[-1][0]
+        converted += len(rows)
+    cursor.execute("SELECT COUNT(*) FROM digest_sections")
+    print(f"Moved {converted} digests into {cursor.fetchone()[0]} unique sections")
+
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_queries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            email_from TEXT,
+            query TEXT,
+            response TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS daily_digests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE UNIQUE,
+            health_data TEXT,
+            calendar_events TEXT,
+            weather_info TEXT,
+            news_updates TEXT,
+            assignments TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_from TEXT,
+            event_title TEXT,
+            event_description TEXT,
+            start_time DATETIME,
+            end_time DATETIME,
+            status TEXT DEFAULT 'pending',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, "one digest row per recipient per date", [
+        _add_digest_recipient,
+    ]),
+    (3, "upstream caches and sync tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS http_cache (
+            cache_key TEXT PRIMARY KEY,
+            url TEXT,
+            body TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS canvas_assignments (
+            user_id INTEGER,
+            assignment_id INTEGER,
+            course_id INTEGER,
+            course_name TEXT,
+            name TEXT,
+            due_at TEXT,
+            points REAL,
+            url TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (user_id, assignment_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS canvas_course_sync (
+            user_id INTEGER,
+            course_id INTEGER,
+            course_name TEXT,
+            synced_at REAL,
+            PRIMARY KEY (user_id, course_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS health_export_cache (
+            path TEXT PRIMARY KEY,
+            mtime REAL,
+            size INTEGER,
+            metrics TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS health_samples (
+            source TEXT,
+            metric TEXT,
+            ts INTEGER,
+            day TEXT,
+            qty REAL,
+            PRIMARY KEY (source, metric, ts)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS health_ingested_files (
+            path TEXT PRIMARY KEY,
+            source TEXT,
+            mtime REAL,
+            size INTEGER
+        )
+        ''',
+    ]),
+    (4, "indexes for history, pending-event and sync lookups", [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_user_queries_sender_time
+        ON user_queries (email_from, timestamp, id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_calendar_events_status_created
+        ON calendar_events (status, created_at, id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_daily_digests_date
+        ON daily_digests (date, id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_canvas_assignments_due
+        ON canvas_assignments (user_id, due_at)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_health_ingested_source
+        ON health_ingested_files (source)
+        ''',
+    ]),
+    (5, "IMAP sync state", [
+        '''
+        CREATE TABLE IF NOT EXISTS imap_state (
+            account TEXT,
+            mailbox TEXT,
+            uidvalidity INTEGER,
+            last_uid INTEGER,
+            PRIMARY KEY (account, mailbox)
+        )
+        ''',
+    ]),
+    (6, "Gemini generation cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS generation_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT,
+            size INTEGER,
+            created_at REAL,
+            last_used REAL,
+            hits INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_generation_cache_last_used
+        ON generation_cache (last_used)
+        ''',
+    ]),
+    (7, "digest composition outcomes", [
+        '''
+        CREATE TABLE IF NOT EXISTS digest_generation_outcomes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at DATETIME,
+            recipient TEXT NOT NULL DEFAULT '',
+            winner TEXT,
+            reason TEXT,
+            latency_ms INTEGER
+        )
+        ''',
+    ]),
+    (8, "local copy of Google Calendar events", [
+        '''
+        CREATE TABLE IF NOT EXISTS calendar_sync_state (
+            account TEXT,
+            calendar_id TEXT,
+            sync_token TEXT,
+            synced_at REAL,
+            PRIMARY KEY (account, calendar_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS calendar_event_cache (
+            account TEXT,
+            calendar_id TEXT,
+            event_id TEXT,
+            summary TEXT,
+            start_raw TEXT,
+            end_raw TEXT,
+            start_utc TEXT,
+            end_utc TEXT,
+            all_day INTEGER,
+            updated TEXT,
+            PRIMARY KEY (account, calendar_id, event_id)
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_calendar_event_cache_start
+        ON calendar_event_cache (account, start_utc)
+        ''',
+    ]),
+    (9, "Google event id for committed calendar requests", [
+        'ALTER TABLE calendar_events ADD COLUMN google_event_id TEXT',
+    ]),
+    (10, "run-history spans", [
+        '''
+        CREATE TABLE IF NOT EXISTS spans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trace_id TEXT,
+            kind TEXT,
+            name TEXT,
+            started_at REAL,
+            duration_ms REAL,
+            status TEXT,
+            detail TEXT
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_spans_started
+        ON spans (started_at)
+        ''',
+    ]),
+    (11, "scheduled jobs", [
+        '''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            time_of_day TEXT NOT NULL,
+            timezone TEXT,
+            payload TEXT,
+            catch_up REAL,
+            next_run REAL NOT NULL,
+            last_run REAL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_kind
+        ON scheduled_jobs (kind)
+        ''',
+    ]),
+    (12, "content-addressed digest sections", [
+        '''
+        CREATE TABLE IF NOT EXISTS digest_sections (
+            hash TEXT PRIMARY KEY,
+            body BLOB NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        _content_address_digests,
+    ]),
+]
@@ -2,29 +2,137 @@ import imaplib
 import email
 import time
 import os
+import re
+import random
+import select
+import ssl
+import queue
+import zlib
 from email.header import decode_header
 import threading
 from datetime import datetime, timedelta
-import re
 from dateutil import parser
 from services.calendar_service import GoogleCalendarService
+from services.calendar_committer import CalendarCommitter
+from services.event_intervals import EventIndex, local_start
 from services.gemini_service import GeminiService
+from services.lazy import LazyService, resolve
+from services import tracing
+
+class _UidTracker:
+    """Tracks queued messages so the persisted last-UID never moves past a
+    message a worker hasn't finished. After a crash, unfinished messages are
+    fetched again on restart (at-least-once delivery)."""
+
+    def __init__(self, db, account, mailbox):
+        self.db = db
+        self.account = account
+        self.mailbox = mailbox
+        self.lock = threading.Lock()
+        self.uidvalidity = None
+        self.cursor = 0
+        self.in_flight = set()
+        self.saved = None
+
+    def reset(self, uidvalidity, last_uid):
+        with self.lock:
+            self.uidvalidity = uidvalidity
+            self.cursor = last_uid
+            self.in_flight.clear()
+            self._save()
+
+    def start(self, uid):
+        with self.lock:
+            self.in_flight.add(uid)
+
+    def cancel(self, uid):
+        with self.lock:
+            self.in_flight.discard(uid)
+
+    def advance(self, uid):
+        """uid has been queued (or skipped); the fetcher continues after it."""
+        with self.lock:
+            self.cursor = max(self.cursor, uid)
+            self._save()
+
+    def finish(self, uid):
+        with self.lock:
+            self.in_flight.discard(uid)
+            self._save()
+
+    def _save(self):
+        watermark = min(self.in_flight) - 1 if self.in_flight else self.cursor
+        watermark = min(watermark, self.cursor)
+        if watermark != self.saved:
+            self.db.set_imap_state(self.account, self.mailbox, self.uidvalidity, watermark)
+            self.saved = watermark
 
 class EmailListenerService:
-    def __init__(self, email_address, password, database_service):
+    def __init__(self, email_address, password, database_service, email_service=None,
+                 calendar_service=None, gemini=None):
         self.email_address = email_address
         self.password = password
         self.db = database_service
-        self.imap_server = "imap.gmail.com"
+        # Shared services (or LazyServices) from the digest; built on first use otherwise
+        self._email_service = email_service or LazyService(
+            'email', lambda: self._default_email_service()
+        )
+        self._calendar_service = calendar_service or LazyService(
+            'calendar', lambda: GoogleCalendarService(db=self.db)
+        )
+        self._gemini = gemini or LazyService('gemini', lambda: GeminiService(db=self.db))
+        # Overridable so the listener can run against a local server (see benchmarks/)
+        self.imap_server = os.getenv('IMAP_SERVER', "imap.gmail.com")
+        self.imap_ssl = os.getenv('IMAP_SSL', 'true').lower() == 'true'
+        self.imap_port = int(os.getenv('IMAP_PORT', '993' if self.imap_ssl else '143'))
+        self.mailbox = "INBOX"
         self.is_running = False
         self.thread = None
-        self.calendar_service = GoogleCalendarService()
-        self.gemini = GeminiService()
+        self._stop_event = threading.Event()
+        # Servers without IDLE are polled this often (seconds)
+        self.poll_interval = int(os.getenv('IMAP_POLL_INTERVAL', '60'))
+        # Re-issue IDLE before servers drop it (RFC 2177 allows 29 minutes)
+        self.idle_timeout = int(os.getenv('IMAP_IDLE_TIMEOUT', '1500'))
+        self.reconnect_base = float(os.getenv('IMAP_RECONNECT_BASE', '5'))
+        self.reconnect_max = float(os.getenv('IMAP_RECONNECT_MAX', '300'))
+        self.fetch_batch = int(os.getenv('IMAP_FETCH_BATCH', '25'))
+        # Handler pool: messages are queued per worker, at most
+        # LISTENER_QUEUE_SIZE in total; LISTENER_BACKPRESSURE decides what a
+        # full queue does to the fetcher: 'block' waits for room, 'defer'
+        # leaves the message on the server for a later pass, 'drop' skips it
+        self.worker_count = max(1, int(os.getenv('LISTENER_WORKERS', '4')))
+        self.queue_size = int(os.getenv('LISTENER_QUEUE_SIZE', '100'))
+        self.backpressure = os.getenv('LISTENER_BACKPRESSURE', 'block').lower()
+        self.defer_delay = float(os.getenv('LISTENER_DEFER_DELAY', '2'))
+        self._queues = []
+        self.worker_threads = []
+        # UIDs the workers have handled, flagged \Seen by the fetcher (the
+        # only thread using the IMAP connection) on its next pass
+        self._handled = []
+        self._handled_lock = threading.Lock()
+        self.tracker = _UidTracker(database_service, email_address, self.mailbox)
+        self.calendar_committer = CalendarCommitter(self._calendar_service, self.db)
+        # How long an "Add Event" reply waits for the batch to be committed
+        self.calendar_commit_wait = float(os.getenv('CALENDAR_COMMIT_WAIT', '20'))
+        # "Analyze Events": gaps up to this many minutes count as back-to-back;
+        # Gemini only adds suggestions on top of the computed facts
+        self.tight_gap_minutes = int(os.getenv('ANALYZE_TIGHT_GAP_MINUTES', '15'))
+        self.analyze_with_gemini = os.getenv('ANALYZE_EVENTS_WITH_GEMINI', 'true').lower() == 'true'
 
     def start(self):
         """Start the email listener in a separate thread."""
         if not self.is_running:
             self.is_running = True
+            self._stop_event.clear()
+            per_worker = max(1, self.queue_size // self.worker_count)
+            self._queues = [queue.Queue(maxsize=per_worker) for _ in range(self.worker_count)]
+            self.worker_threads = [
+                threading.Thread(target=self._worker, args=(work_queue,), daemon=True)
+                for work_queue in self._queues
+            ]
+            for worker in self.worker_threads:
+                worker.start()
+            self.calendar_committer.start()
             self.thread = threading.Thread(target=self._listen_for_emails)
             self.thread.daemon = True
             self.thread.start()
@@ -33,51 +141,274 @@ class EmailListenerService:
     def stop(self):
         """Stop the email listener."""
         self.is_running = False
+        self._stop_event.set()
         if self.thread:
             self.thread.join()
+            for worker in self.worker_threads:
+                worker.join()
+            self.calendar_committer.stop()
             print("Email listener stopped")
 
     def _listen_for_emails(self):
-        """Continuously check for new emails."""
+        """Keep an IMAP session open, processing new mail as it arrives and
+        reconnecting with exponential backoff after failures."""
+        failures = 0
         while self.is_running:
+            mail = None
             try:
-                # Connect to IMAP server
-                mail = imaplib.IMAP4_SSL(self.imap_server)
+                if self.imap_ssl:
+                    mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+                else:
+                    mail = imaplib.IMAP4(self.imap_server, self.imap_port)
                 mail.login(self.email_address, self.password)
-                
-                while self.is_running:
-                    # Select inbox
-                    mail.select("INBOX")
-                    
-                    # Search for unread emails
-                    _, messages = mail.search(None, "UNSEEN")
-                    
-                    for num in messages[0].split():
-                        # Fetch email message
-                        _, msg_data = mail.fetch(num, "(RFC822)")
-                        email_body = msg_data[0][1]
-                        email_message = email.message_from_bytes(email_body)
-                        
-                        # Process the email
-                        self._process_email(email_message)
-                        
-                    # Wait before checking again
-                    time.sleep(60)
-                    
+                failures = 0
+                self._run_session(mail)
+
             except Exception as e:
-                print(f"Error in email listener: {str(e)}")
-                time.sleep(300)  # Wait 5 minutes before retrying
-                
+                failures += 1
+                delay = self._reconnect_delay(failures)
+                print(f"Error in email listener: {str(e)} (reconnecting in {delay:.0f}s)")
+                self._stop_event.wait(delay)
+
             finally:
-                try:
-                    mail.logout()
-                except:
-                    pass
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+
+    def _reconnect_delay(self, failures):
+        """Jittered exponential backoff: base, 2x base, 4x base... up to the cap."""
+        delay = min(self.reconnect_max, self.reconnect_base * (2 ** (failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run_session(self, mail):
+        """Queue new messages for the workers, then wait for more, until
+        stopped or disconnected."""
+        mail.select(self.mailbox)
+        uidvalidity = int(mail.response('UIDVALIDITY')[1][0] or 0)
+        uidnext = mail.response('UIDNEXT')[1][0]
+
+        state = self.db.get_imap_state(self.email_address, self.mailbox)
+        if state is None or state[0] != uidvalidity:
+            # First run (or the mailbox was rebuilt): handle what's unread, then
+            # track everything after the current end of the mailbox
+            if uidnext:
+                last_uid = int(uidnext) - 1
+            else:
+                _, data = mail.uid('SEARCH', None, 'ALL')
+                last_uid = max(map(int, data[0].split()), default=0)
+            _, data = mail.uid('SEARCH', None, 'UNSEEN')
+            unseen = sorted(int(uid) for uid in data[0].split())
+            self.tracker.reset(uidvalidity, max([last_uid] + unseen))
+            self._clear_handled()
+            # These sit below the cursor, so a deferred one must be retried here
+            while unseen and self.is_running:
+                self._flag_handled(mail)
+                unseen = self._queue_uids(mail, unseen, track=False)
+                if unseen:
+                    self._stop_event.wait(self.defer_delay)
+        elif self.tracker.uidvalidity != uidvalidity:
+            self.tracker.reset(uidvalidity, state[1])
+            self._clear_handled()
+        # else: reconnected mid-run; the tracker's cursor already covers
+        # messages the workers still hold, so they aren't queued twice
+
+        supports_idle = 'IDLE' in mail.capabilities
+        while self.is_running:
+            self._flag_handled(mail)
+            _, data = mail.uid('SEARCH', None, f'UID {self.tracker.cursor + 1}:*')
+            # "n:*" always matches the newest message, even if it's below n
+            new_uids = sorted(uid for uid in map(int, data[0].split()) if uid > self.tracker.cursor)
+            if new_uids and self._queue_uids(mail, new_uids):
+                # Queue full under the 'defer' policy: retry shortly instead of idling
+                self._stop_event.wait(self.defer_delay)
+                continue
+
+            if supports_idle:
+                self._idle(mail)
+            else:
+                self._stop_event.wait(self.poll_interval)
+                mail.noop()
+
+    def _queue_uids(self, mail, uids, track=True):
+        """Fetch messages in UID order, one round-trip per batch, and hand them
+        to the workers. Returns the UIDs deferred to a later pass because the
+        queue was full (empty once everything is queued)."""
+        for i in range(0, len(uids), self.fetch_batch):
+            batch = uids[i:i + self.fetch_batch]
+            # BODY.PEEK leaves \Seen alone; it's set once a worker has handled the message
+            with tracing.trace('listener', 'fetch'):
+                _, data = mail.uid('FETCH', ','.join(map(str, batch)), '(BODY.PEEK[])')
+            messages = {}
+            for part in data:
+                if isinstance(part, tuple):
+                    match = re.search(rb'UID (\d+)', part[0])
+                    if match:
+                        messages[int(match.group(1))] = part[1]
+
+            for j, uid in enumerate(batch):
+                if uid not in messages:
+                    # Expunged since the search
+                    if track:
+                        self.tracker.advance(uid)
+                    continue
+                if not self._enqueue(uid, email.message_from_bytes(messages[uid]), track):
+                    return uids[i + j:]
+        return []
+
+    def _mark_handled(self, uid):
+        with self._handled_lock:
+            self._handled.append(uid)
+
+    def _clear_handled(self):
+        # UIDs from an older UIDVALIDITY no longer name the same messages
+        with self._handled_lock:
+            self._handled = []
+
+    def _flag_handled(self, mail):
+        """Set \\Seen on the messages the workers have finished with. Messages
+        still queued when the listener stops stay unread on the server."""
+        with self._handled_lock:
+            uids, self._handled = self._handled, []
+        if not uids:
+            return
+        try:
+            mail.uid('STORE', ','.join(map(str, sorted(uids))), '+FLAGS.SILENT', '(\\Seen)')
+        except BaseException:
+            # Try again on the next connection
+            with self._handled_lock:
+                self._handled.extend(uids)
+            raise
+
+    def _enqueue(self, uid, message, track):
+        """Put a message on its sender's worker queue, applying the backpressure
+        policy when that queue is full. False means the message was deferred."""
+        sender = email.utils.parseaddr(message["From"])[1]
+        # Same sender -> same worker, so one sender's messages are handled in order
+        work_queue = self._queues[zlib.crc32(sender.lower().encode()) % len(self._queues)]
+        if track:
+            self.tracker.start(uid)
+        item = (uid, message, track)
+
+        try:
+            if self.backpressure == 'block':
+                while True:
+                    try:
+                        work_queue.put(item, timeout=1)
+                        break
+                    except queue.Full:
+                        if not self.is_running:
+                            raise
+            else:
+                work_queue.put_nowait(item)
+        except queue.Full:
+            if track:
+                self.tracker.cancel(uid)
+            if self.backpressure == 'drop':
+                print(f"Listener queue full, dropping message {uid} from {sender}")
+                if track:
+                    self.tracker.advance(uid)
+                return True
+            return False
+
+        if track:
+            self.tracker.advance(uid)
+        return True
+
+    def _worker(self, work_queue):
+        """Handle queued messages until the listener stops."""
+        while self.is_running:
+            try:
+                uid, message, track = work_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                with tracing.trace('listener', 'message'):
+                    self._process_email(message)
+            except Exception as e:
+                print(f"Failed to process message {uid}: {str(e)}")
+            finally:
+                if track:
+                    self.tracker.finish(uid)
+                self._mark_handled(uid)
+
+    def _idle(self, mail):
+        """Wait in IMAP IDLE until the server announces new mail, a worker
+        finishes a message (to flag it \\Seen), the idle timeout passes or the
+        listener is stopped."""
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+        response = mail.readline()
+        if not response.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {response.decode(errors='replace').strip()}")
+
+        sock = mail.socket()
+        deadline = time.monotonic() + self.idle_timeout
+        alive = True
+        try:
+            while self.is_running and not self._handled and time.monotonic() < deadline:
+                # Wake up every second to notice stop(); a line may already sit in
+                # imaplib's read buffer (or SSL's), where select can't see it
+                if not self._buffered(mail, sock):
+                    readable, _, _ = select.select([sock], [], [], 1.0)
+                    if not readable:
+                        continue
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed during IDLE")
+                if line.startswith(b'*') and (b'EXISTS' in line or b'RECENT' in line):
+                    break
+        except BaseException:
+            # The connection is in an unknown state and will be replaced; don't
+            # let a failed DONE hide the original error
+            alive = False
+            raise
+        finally:
+            if alive:
+                mail.send(b'DONE\r\n')
+                while True:
+                    line = mail.readline()
+                    if not line:
+                        raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+                    if line.startswith(tag):
+                        break
+
+    @staticmethod
+    def _buffered(mail, sock):
+        """Whether data is ready to read without touching the socket. Peeks
+        with the socket briefly non-blocking, so bytes SSL has already
+        decrypted are noticed too."""
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return bool(mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
 
     def _process_email(self, email_message):
         """Process an incoming email message."""
+        with tracing.span('parse'):
+            sender, subject, body = self._parse_email(email_message)
+
+        # Process the query and generate response
+        with tracing.span('handler'):
+            response = self._generate_response(subject, body, sender)
+        
+        # Store the interaction in the database
+        with tracing.span('db_write'):
+            self._store_interaction(sender, body, response)
+        
+        # Send response
+        with tracing.span('reply'):
+            self._send_response(sender, response, subject)
+
+    def _parse_email(self, email_message):
+        """Extract (sender, subject, plain-text body) from a message."""
         # Get sender
-        self.current_sender = email.utils.parseaddr(email_message["From"])[1]
+        sender = email.utils.parseaddr(email_message["From"])[1]
         
         # Get subject and decode if necessary
         subject = decode_header(email_message["Subject"])[0]
@@ -95,23 +426,15 @@ class EmailListenerService:
                     break
         else:
             body = email_message.get_payload(decode=True).decode()
-            
-        # Process the query and generate response
-        response = self._generate_response(subject, body)
-        
-        # Store the interaction in the database
-        self._store_interaction(self.current_sender, body, response)
-        
-        # Send response
-        self._send_response(self.current_sender, response, subject)
+        return sender, subject, body
 
-    def _generate_response(self, subject, body):
+    def _generate_response(self, subject, body, sender):
         """Generate a response based on the email content."""
         subject_lower = subject.lower()
         
         # Check for different types of requests
         if subject_lower.startswith('add event') or subject_lower.startswith('new event'):
-            return self._process_calendar_request(body)
+            return self._process_calendar_request(body, sender)
         elif any(keyword in subject_lower for keyword in ['show events', 'list events', 'upcoming events', 'my events']):
             return self._get_upcoming_events()
         elif subject_lower.startswith('analyze events') or subject_lower.startswith('event insights'):
@@ -120,67 +443,88 @@ class EmailListenerService:
         # Handle other types of queries
         return f"Thank you for your message. I received your query: {body[:100]}...\n\nYou can:\n- Add events (Subject: 'Add Event')\n- View upcoming events (Subject: 'Show Events')\n- Get event insights (Subject: 'Analyze Events')"
 
-    def _process_calendar_request(self, body):
-        """Process an email containing calendar event details."""
-        try:
-            # Extract event details using regex patterns
-            title_match = re.search(r'Title:\s*(.+?)(?:\n|$)', body)
-            date_match = re.search(r'Date:\s*(.+?)(?:\n|$)', body)
-            time_match = re.search(r'Time:\s*(.+?)(?:\n|$)', body)
-            duration_match = re.search(r'Duration:\s*(.+?)(?:\n|$)', body)
-            description_match = re.search(r'Description:\s*(.+?)(?:\n|$)', body)
-
-            if not (title_match and date_match and time_match):
-                return """Invalid event format. Please use the following format:
-Title: Event Name
+    def _parse_event_block(self, block):
+        """Parse one Title/Date/Time/Duration/Description block into event
+        fields. Field names are matched at the start of a line, in any case."""
+        def field(name):
+            return re.search(rf'(?im)^\s*{name}:[ \t]*(.+?)[ \t]*$', block)
+
+        title_match = field('Title')
+        date_match = field('Date')
+        time_match = field('Time')
+        duration_match = field('Duration')
+        description_match = field('Description')
+
+        if not (title_match and date_match and time_match):
+            raise ValueError("missing Title, Date or Time")
+
+        title = title_match.group(1).strip()
+        date_str = date_match.group(1).strip()
+        time_str = time_match.group(1).strip()
+        
+        # Parse start time
+        start_time = parser.parse(f"{date_str} {time_str}")
+        
+        # Calculate end time
+        duration_hours = 1  # default duration
+        if duration_match:
+            duration_str = duration_match.group(1).strip()
+            duration_hours = float(re.search(r'(\d+(?:\.\d+)?)', duration_str).group(1))
+        
+        return {
+            'title': title,
+            'description': description_match.group(1).strip() if description_match else "",
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=duration_hours),
+        }
+
+    def _process_calendar_request(self, body, sender):
+        """Process an email containing one or more calendar event blocks.
+
+        Each block starts with a "Title:" line. Valid events are stored as
+        pending rows in one transaction and added by the calendar committer
+        in a single batch request; the reply waits briefly for the outcome.
+        """
+        event_format = """Title: Event Name
 Date: YYYY-MM-DD
 Time: HH:MM
 Duration: X hours (optional, defaults to 1 hour)
 Description: Event description (optional)"""
+        try:
+            # Same case policy as _parse_event_block; text before the first block is ignored
+            blocks = [block for block in re.split(r'(?im)^(?=\s*Title:)', body) if re.match(r'(?i)\s*Title:', block)]
+            events = []
+            problems = []
+            for number, block in enumerate(blocks, 1):
+                try:
+                    events.append(self._parse_event_block(block))
+                except Exception as e:
+                    problems.append(f"Event {number}: {str(e)}")
 
-            title = title_match.group(1).strip()
-            date_str = date_match.group(1).strip()
-            time_str = time_match.group(1).strip()
-            
-            # Parse start time
-            start_time = parser.parse(f"{date_str} {time_str}")
-            
-            # Calculate end time
-            duration_hours = 1  # default duration
-            if duration_match:
-                duration_str = duration_match.group(1).strip()
-                duration_hours = float(re.search(r'(\d+(?:\.\d+)?)', duration_str).group(1))
-            
-            end_time = start_time + timedelta(hours=duration_hours)
-            
-            # Get description if available
-            description = description_match.group(1).strip() if description_match else ""
-
-            # Store in database
-            event_id = self.db.store_calendar_event(
-                email_from=self.current_sender,
-                title=title,
-                description=description,
-                start_time=start_time,
-                end_time=end_time
-            )
-
-            # Add to Google Calendar
-            try:
-                self.calendar_service.add_event(
-                    title=title,
-                    description=description,
-                    start_time=start_time,
-                    end_time=end_time
-                )
-                self.db.update_calendar_event_status(event_id, 'added')
-                return f"Successfully added event '{title}' to your calendar for {start_time.strftime('%B %d, %Y at %I:%M %p')}"
-            except Exception as e:
-                self.db.update_calendar_event_status(event_id, 'failed')
-                return f"Failed to add event to calendar: {str(e)}"
+            if not events:
+                reasons = "".join(f"\n⚠️ {problem}" for problem in problems)
+                return f"Invalid event format.{reasons}\n\nPlease use the following format (repeat the block for more events):\n{event_format}"
+
+            # Store in database; the committer adds them to Google Calendar
+            event_ids = self.db.store_calendar_events(sender, events)
+            self.calendar_committer.submit(event_ids)
+            results = self.calendar_committer.wait(event_ids, self.calendar_commit_wait)
+
+            lines = []
+            for event_id, event in zip(event_ids, events):
+                when = event['start_time'].strftime('%B %d, %Y at %I:%M %p')
+                status, detail = results.get(event_id, ('pending', None))
+                if status == 'added':
+                    lines.append(f"✅ Added '{event['title']}' for {when}")
+                elif status == 'failed':
+                    lines.append(f"❌ Failed to add '{event['title']}' for {when}: {detail}")
+                else:
+                    lines.append(f"⏳ '{event['title']}' for {when} is queued and will be added shortly")
+            lines.extend(f"⚠️ Skipped {problem}" for problem in problems)
+            return "\n".join(lines)
 
         except Exception as e:
-            return f"Error processing calendar request: {str(e)}\n\nPlease use the following format:\nTitle: Event Name\nDate: YYYY-MM-DD\nTime: HH:MM\nDuration: X hours (optional)\nDescription: Event description (optional)"
+            return f"Error processing calendar request: {str(e)}\n\nPlease use the following format:\n{event_format}"
 
     def _get_upcoming_events(self, days=7):
         """Get upcoming calendar events."""
@@ -188,7 +532,7 @@ Description: Event description (optional)"""
             # Get events from Google Calendar
             today = datetime.now()
             end_date = today + timedelta(days=days)
-            events = self.calendar_service.get_events(today, end_date)
+            events = self.calendar_service.get_event_list(today, end_date)
             
             if not events:
                 return "You have no upcoming events in the next 7 days."
@@ -196,7 +540,7 @@ Description: Event description (optional)"""
             # Format events nicely
             response = "Your upcoming events:\n\n"
             for event in events:
-                response += f"📅 {event}\n\n"
+                response += f"📅 {self.calendar_service.describe_event(event)}\n\n"
             
             response += "\nTo add new events, send an email with subject 'Add Event' and follow the format:\nTitle: Event Name\nDate: YYYY-MM-DD\nTime: HH:MM\nDuration: X hours (optional)\nDescription: Event description (optional)"
             
@@ -205,42 +549,91 @@ Description: Event description (optional)"""
         except Exception as e:
             return f"Error retrieving events: {str(e)}"
 
+    def _schedule_facts(self, events, first_day, days):
+        """Conflicts, tight transitions and free time computed from the events."""
+        index = EventIndex(events)
+        lines = []
+        busy = index.busy_hours_by_day()
+        total = sum(busy.values())
+        lines.append(f"{len(events)} events over the next {days} days, {total:.1f} hours scheduled.")
+        if busy:
+            busiest = max(busy, key=busy.get)
+            lines.append(f"Busiest day: {busiest.strftime('%A, %B %d')} ({busy[busiest]:.1f} hours).")
+
+        overlaps = index.overlaps()
+        lines.append("")
+        if overlaps:
+            lines.append("Conflicts:")
+            for first, second, overlap in overlaps:
+                lines.append(
+                    f"- {local_start(second).strftime('%a %b %d %H:%M')}: '{first['summary']}' overlaps "
+                    f"'{second['summary']}' by {int(overlap.total_seconds() // 60)} min"
+                )
+        else:
+            lines.append("Conflicts: none")
+
+        transitions = index.tight_transitions(timedelta(minutes=self.tight_gap_minutes))
+        if transitions:
+            lines.append("")
+            lines.append(f"Back-to-back (≤{self.tight_gap_minutes} min between):")
+            for before, after, gap in transitions:
+                gap_text = "no break" if not gap else f"{int(gap.total_seconds() // 60)} min"
+                lines.append(
+                    f"- {local_start(after).strftime('%a %b %d %H:%M')}: '{before['summary']}' → "
+                    f"'{after['summary']}' ({gap_text})"
+                )
+
+        free = index.free_blocks(first_day, days, not_before=datetime.now().astimezone())
+        if free:
+            lines.append("")
+            lines.append("Free blocks of an hour or more (8:00-20:00):")
+            by_day = {}
+            for block_start, block_end in free:
+                by_day.setdefault(block_start.date(), []).append(
+                    f"{block_start.strftime('%H:%M')}-{block_end.strftime('%H:%M')}"
+                )
+            for day, blocks in by_day.items():
+                lines.append(f"- {day.strftime('%a %b %d')}: {', '.join(blocks)}")
+
+        if index.all_day:
+            lines.append("")
+            lines.append("All-day: " + ", ".join(self.calendar_service.describe_event(event) for event in index.all_day))
+        return "\n".join(lines)
+
     def _analyze_upcoming_events(self, days=7):
-        """Get upcoming events and generate insights using Gemini."""
+        """Summarize upcoming events: conflicts, tight timings and free time are
+        computed locally; Gemini, when available, only adds suggestions."""
         try:
-            # Get events from Google Calendar
             today = datetime.now()
             end_date = today + timedelta(days=days)
-            events = self.calendar_service.get_events(today, end_date)
+            events = self.calendar_service.get_event_list(today, end_date)
             
             if not events:
                 return "You have no upcoming events to analyze in the next 7 days."
-            
-            # Format events for Gemini
+
+            facts = self._schedule_facts(events, today.date(), days)
+
             events_text = "Upcoming events:\n"
             for event in events:
-                events_text += f"- {event}\n"
-            
-            # Generate insights using Gemini
-            prompt = f"""Here are the user's upcoming calendar events for the next 7 days:
+                events_text += f"- {self.calendar_service.describe_event(event)}\n"
+
+            insights = None
+            if self.analyze_with_gemini:
+                prompt = f"""Here are the user's upcoming calendar events for the next {days} days:
 
 {events_text}
+These facts about their schedule have already been computed and are correct:
 
-Please provide:
-1. A brief overview of their schedule
-2. Any potential scheduling conflicts or tight timings
-3. Suggestions for better time management
-4. Tips for preparation or things to keep in mind
-5. Any patterns or insights about their schedule
+{facts}
 
-Keep the response concise but informative."""
+Using them, give 2-4 brief suggestions for time management and preparation.
+Don't repeat the facts or list the events again."""
+                insights = self.gemini.generate_text(prompt)
 
-            insights = self.gemini.generate_text(prompt)
-            
-            if not insights:
-                insights = "Unable to generate insights at the moment. Here are your upcoming events:\n\n" + events_text
-            
-            return insights
+            response = f"Your schedule for the next {days} days:\n\n{facts}"
+            if insights:
+                response += f"\n\nSuggestions:\n{insights}"
+            return response
 
         except Exception as e:
             return f"Error analyzing events: {str(e)}"
@@ -249,9 +642,24 @@ Keep the response concise but informative."""
         """Store the interaction in the database."""
         self.db.store_query(sender, query, response)
 
-    def _send_response(self, to_address, response, subject):
-        """Send a response email."""
+    def _default_email_service(self):
         from services.email_service import EmailService
-        email_service = EmailService(self.email_address, self.password)
+        return EmailService(self.email_address, self.password)
+
+    @property
+    def email_service(self):
+        """Outgoing mail goes through one shared EmailService (and its pooled SMTP session)."""
+        return resolve(self._email_service)
+
+    @property
+    def calendar_service(self):
+        return resolve(self._calendar_service)
+
+    @property
+    def gemini(self):
+        return resolve(self._gemini)
+
+    def _send_response(self, to_address, response, subject):
+        """Queue a response email."""
         reply_subject = f"Re: {subject}" if not subject.startswith("Re:") else subject
-        email_service.send_email(to_address, reply_subject, response) 
\ No newline at end of file
+        self.email_service.send_email(to_address, reply_subject, response)
@@ -1,11 +1,12 @@
-import yagmail
 import os
 from datetime import datetime
+from services.mail_outbox import get_mail_outbox
 
 class EmailService:
     def __init__(self, email_address, app_password):
         self.email = email_address
         self.is_configured = False
+        self.outbox = None
         
         # Add more detailed debugging for environment variable
         print("\nEmail Service Debug:")
@@ -32,22 +33,22 @@ class EmailService:
             print("Email credentials not configured in .env file")
             return
             
-        try:
-            print("Attempting to connect to Gmail...")
-            self.yag = yagmail.SMTP(email_address, app_password)
-            self.is_configured = True
-            print("Gmail connection successful!")
-        except Exception as e:
-            print(f"Email setup failed with error: {str(e)}")
-            print("Make sure you're using an App Password from Google Account settings")
+        # Every EmailService for this account shares one queued, pooled SMTP session
+        self.outbox = get_mail_outbox(email_address, app_password)
+        self.is_configured = True
+        print("Gmail outbox ready (connects on first send)")
 
-    def send_digest(self, content):
+    def send_digest(self, content, to=None):
         # Format today's date for the subject
         today = datetime.now()
         subject = f"Today's Plan - {today.strftime('%A, %B %d')}"
+        return self.send_email(to or self.email, subject, content, preview_title="DIGEST EMAIL PREVIEW")
 
+    def send_email(self, to, subject, content, preview_title="EMAIL PREVIEW"):
+        """Queue an email for delivery; returns as soon as it's queued."""
         if self.test_mode:
-            print("\n========== DIGEST EMAIL PREVIEW ==========")
+            print(f"\n========== {preview_title} ==========")
+            print(f"To: {to}")
             print(f"Subject: {subject}")
             print(content)
             print("========== END EMAIL PREVIEW ==========\n")
@@ -70,16 +71,11 @@ Email not configured. To set up email:
 """)
             return False
             
-        try:
-            print(f"Attempting to send email to {self.email}...")
-            self.yag.send(
-                to=self.email,
-                subject=subject,
-                contents=content
-            )
-            print("Email sent successfully!")
-            return True
-        except Exception as e:
-            print(f"Failed to send email with error: {str(e)}")
-            print("Check that your App Password is correct and has no spaces")
-            return False 
\ No newline at end of file
+        print(f"Queueing email to {to}...")
+        return self.outbox.send(to, subject, content)
+
+    def flush(self, timeout=60):
+        """Wait for queued emails to be delivered."""
+        if self.outbox:
+            return self.outbox.flush(timeout)
+        return True 
\ No newline at end of file
@@ -0,0 +1,118 @@
+import heapq
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+UTC_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+def _parse_utc(value):
+    return datetime.strptime(value, UTC_FORMAT).replace(tzinfo=timezone.utc)
+
+def local_start(event):
+    """An event's start in local time."""
+    return _parse_utc(event['start_utc']).astimezone()
+
+class EventIndex:
+    """Sorted interval index over calendar events (as returned by
+    GoogleCalendarService.get_event_list).
+
+    Timed events are kept sorted by start, so overlaps, tight transitions and
+    free time all come out of single sweeps (O(n log n)); range queries use
+    bisection on the starts plus the longest event duration. All-day events
+    are kept aside; they rarely block time and would otherwise overlap
+    everything on their day.
+    """
+
+    def __init__(self, events):
+        self.all_day = [event for event in events if event['all_day']]
+        timed = []
+        for event in events:
+            if event['all_day']:
+                continue
+            start, end = _parse_utc(event['start_utc']), _parse_utc(event['end_utc'])
+            timed.append((start, end, event))
+        timed.sort(key=lambda item: (item[0], item[1]))
+        self.intervals = timed
+        self._starts = [start for start, _, _ in timed]
+        self._longest = max((end - start for start, end, _ in timed), default=timedelta(0))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def between(self, start, end):
+        """Events overlapping [start, end), earliest first."""
+        low = bisect_left(self._starts, start - self._longest)
+        high = bisect_left(self._starts, end)
+        return [event for s, e, event in self.intervals[low:high] if e > start and s < end]
+
+    def overlaps(self):
+        """Every pair of overlapping events as (first, second, overlap)."""
+        pairs = []
+        active = []  # (end, position, start, event) of events still running
+        for position, (start, end, event) in enumerate(self.intervals):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for other_end, _, _, other in active:
+                pairs.append((other, event, min(end, other_end) - start))
+            heapq.heappush(active, (end, position, start, event))
+        pairs.sort(key=lambda pair: pair[1]['start_utc'])
+        return pairs
+
+    def tight_transitions(self, max_gap=timedelta(minutes=15)):
+        """Consecutive events separated by at most max_gap, as (before, after, gap)."""
+        transitions = []
+        latest_end, latest = None, None
+        for start, end, event in self.intervals:
+            if latest_end is not None and timedelta(0) <= start - latest_end <= max_gap:
+                transitions.append((latest, event, start - latest_end))
+            if latest_end is None or end > latest_end:
+                latest_end, latest = end, event
+        return transitions
+
+    def busy_blocks(self):
+        """Merged busy time as (start, end) UTC pairs."""
+        merged = []
+        for start, end, _ in self.intervals:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [tuple(block) for block in merged]
+
+    def free_blocks(self, first_day, days, day_start=8, day_end=20, min_length=timedelta(hours=1), not_before=None):
+        """Free stretches of at least min_length within each day's
+        day_start-day_end hours (local time), as local (start, end) pairs.
+        Time before not_before (an aware datetime) is never free."""
+        busy = self.busy_blocks()
+        free = []
+        position = 0
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            window_start = datetime(day.year, day.month, day.day, day_start).astimezone()
+            window_end = datetime(day.year, day.month, day.day, day_end).astimezone()
+            if not_before is not None:
+                window_start = max(window_start, not_before.astimezone())
+            while position < len(busy) and busy[position][1] <= window_start:
+                position += 1
+            cursor = window_start
+            index = position
+            while index < len(busy) and busy[index][0] < window_end:
+                block_start, block_end = busy[index]
+                if block_start - cursor >= min_length:
+                    free.append((cursor, block_start.astimezone()))
+                cursor = max(cursor, block_end.astimezone())
+                index += 1
+            if window_end - cursor >= min_length:
+                free.append((cursor, window_end))
+        return free
+
+    def busy_hours_by_day(self):
+        """Hours of scheduled (merged) time per local date."""
+        hours = {}
+        for start, end in self.busy_blocks():
+            start, end = start.astimezone(), end.astimezone()
+            while start < end:
+                next_midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time()).astimezone()
+                chunk_end = min(end, next_midnight)
+                hours[start.date()] = hours.get(start.date(), 0) + (chunk_end - start).total_seconds() / 3600
+                start = chunk_end
+        return hours
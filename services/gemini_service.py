@@ -1,22 +1,57 @@
 import os
-import google.generativeai as genai
 import re
+import time
 import logging
+from services.generation_cache import GenerationCache
+from services.prompt_builder import PromptBuilder
 
 # Configure logging to suppress gRPC warnings
 logging.basicConfig(level=logging.ERROR)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
+DIGEST_PROMPT = """You are a personal assistant writing a morning digest email. Write a friendly, concise email that includes all the data provided.
+
+IMPORTANT: Return ONLY valid HTML that follows this exact structure:
+<html><body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0; padding: 0; background-color: #ffffff; color: #000000;">[Your content here, using h1, h2, p, and div tags with inline styles]</body></html>
+
+Use these styles:
+- h1: style="font-size: 24px; margin: 0 0 15px 0; color: #000000;"
+- h2: style="font-size: 18px; margin: 15px 0 5px 0; color: #000000;"
+- p: style="margin: 0 0 10px 0; color: #000000;"
+- div: style="margin: 0; padding: 0; background: none;"
+- ul: style="margin: 0 0 15px 0; padding-left: 20px;"
+
+Data to include:
+{data}
+
+Guidelines:
+1. Keep the emojis from the original data
+2. Add 1-2 brief suggestions about which assignments to prioritize
+3. Return a single line of HTML with NO extra spaces or newlines
+4. Use ONLY the styles specified above
+5. Keep the tone friendly but professional and motivating
+6. If there are assignments due today, emphasize their urgency
+7. Suggest a study schedule if there are multiple assignments"""
+
 class GeminiService:
-    def __init__(self):
+    MODEL_NAME = 'gemini-pro'
+
+    def __init__(self, db=None):
+        # Identical prompts (resends, repeated questions) are answered from
+        # the database instead of calling the model again
+        self.cache = GenerationCache(db) if db is not None else None
+        self.prompt_builder = PromptBuilder()
+
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             print("Warning: GEMINI_API_KEY not set, using default formatting")
             self.model = None
             return
             
+        # The SDK is slow to import; only pay for it when Gemini is configured
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
 
     def _clean_data(self, text):
         if not text:
@@ -27,51 +62,80 @@ class GeminiService:
         text = re.sub(r'\s*(<[^>]+>)\s*', r'\1', text)
         return text
 
-    def generate_email(self, health_data, events, weather, news, assignments):
-        if not self.model:
-            return None
-            
-        # Clean all input data
-        health_data = self._clean_data(health_data)
-        events = self._clean_data(events)
-        weather = self._clean_data(weather)
-        news = self._clean_data(news)
-        assignments = self._clean_data(assignments)
-            
-        prompt = f"""You are a personal assistant writing a morning digest email. Write a friendly, concise email that includes all the data provided.
+    def _generate(self, prompt, deadline=None):
+        """Run the prompt through the model, answering repeats from the cache.
 
-IMPORTANT: Return ONLY valid HTML that follows this exact structure:
-<html><body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0; padding: 0; background-color: #ffffff; color: #000000;">[Your content here, using h1, h2, p, and div tags with inline styles]</body></html>
+        With a deadline (time.monotonic() value) the response is streamed so
+        a slow generation can be abandoned as soon as the deadline passes.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.MODEL_NAME, prompt)
+            text = self.cache.get(key)
+            stats = self.cache.stats()
+            print(f"Gemini cache {'hit' if text is not None else 'miss'} "
+                  f"({stats['hits']} hits, {stats['misses']} misses this run)")
+            if text is not None:
+                return text
 
-Use these styles:
-- h1: style="font-size: 24px; margin: 0 0 15px 0; color: #000000;"
-- h2: style="font-size: 18px; margin: 15px 0 5px 0; color: #000000;"
-- p: style="margin: 0 0 10px 0; color: #000000;"
-- div: style="margin: 0; padding: 0; background: none;"
-- ul: style="margin: 0 0 15px 0; padding-left: 20px;"
+        if deadline is None:
+            text = self.model.generate_content(prompt).text
+        else:
+            text = self._generate_streaming(prompt, deadline)
 
-Data to include:
-ASSIGNMENTS: {assignments}
-HEALTH: {health_data}
-CALENDAR: {events}
-WEATHER: {weather}
-NEWS: {news}
+        if key is not None:
+            self.cache.put(key, self.MODEL_NAME, text)
+        return text
 
-Guidelines:
-1. Keep the emojis from the original data
-2. Add 1-2 brief suggestions about which assignments to prioritize
-3. Return a single line of HTML with NO extra spaces or newlines
-4. Use ONLY the styles specified above
-5. Keep the tone friendly but professional and motivating
-6. If there are assignments due today, emphasize their urgency
-7. Suggest a study schedule if there are multiple assignments"""
+    def _generate_streaming(self, prompt, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Gemini deadline passed before the request started")
+        # google-generativeai 0.3.1 puts any extra keyword into the request
+        # message rather than the RPC, so there's no per-call timeout to pass;
+        # the deadline is enforced here between chunks and by the caller's race
+        response = self.model.generate_content(prompt, stream=True)
+        chunks = []
+        for chunk in response:
+            chunks.append(chunk.text)
+            if time.monotonic() > deadline:
+                raise TimeoutError("Gemini deadline passed mid-response")
+        return ''.join(chunks)
+
+    def generate_text(self, prompt):
+        """Generate a plain-text answer for a free-form prompt."""
+        if not self.model:
+            return None
+
+        try:
+            return self._generate(prompt).strip()
+        except Exception as e:
+            print(f"Gemini generation failed: {str(e)}")
+            return None
+
+    def generate_email(self, health_data, events, weather, news, assignments, deadline=None):
+        """Compose the digest HTML, or return None if Gemini isn't configured.
+        With a deadline (a time.monotonic() value) generation is abandoned
+        once it passes. Failures, including TimeoutError, are raised so the
+        caller can tell them apart."""
+        if not self.model:
+            return None
+            
+        sections = {
+            'health': health_data,
+            'events': events,
+            'weather': weather,
+            'news': news,
+            'assignments': assignments,
+        }
+        prompt, report = self.prompt_builder.build(DIGEST_PROMPT, sections)
+        print(self.prompt_builder.describe(report))
         
         try:
-            response = self.model.generate_content(prompt)
-            content = self._clean_data(response.text)
-            if not content.startswith('<html>'):
-                content = f'<html><body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0; padding: 0; background-color: #ffffff; color: #000000;">{content}</body></html>'
-            return content
+            content = self._clean_data(self._generate(prompt, deadline))
         except Exception as e:
             print(f"Gemini generation failed: {str(e)}")
-            return None 
\ No newline at end of file
+            raise
+        if not content.startswith('<html>'):
+            content = f'<html><body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0; padding: 0; background-color: #ffffff; color: #000000;">{content}</body></html>'
+        return content 
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+import re
+import time
+import hashlib
+import threading
+
+class GenerationCache:
+    """Content-addressed cache for model generations, persisted in the digest database.
+
+    Entries are keyed by a hash of the model name and the whitespace-normalized
+    prompt, so a resend or a repeated question over unchanged data reuses the
+    earlier answer. Entries expire after GEMINI_CACHE_TTL seconds, and the
+    least recently used ones are evicted once the cache grows past
+    GEMINI_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, database_service):
+        self.db = database_service
+        self.ttl = float(os.getenv('GEMINI_CACHE_TTL', '86400'))
+        self.max_bytes = int(os.getenv('GEMINI_CACHE_MAX_BYTES', str(5 * 1024 * 1024)))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, model_name, prompt):
+        normalized = re.sub(r'\s+', ' ', prompt).strip()
+        return hashlib.sha256(f"{model_name}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None."""
+        now = time.time()
+        try:
+            response = self.db.get_cached_generation(key, now - self.ttl, now)
+        except Exception as e:
+            print(f"Generation cache lookup failed: {str(e)}")
+            response = None
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key, model_name, response):
+        now = time.time()
+        try:
+            self.db.store_cached_generation(key, model_name, response, now, now - self.ttl, self.max_bytes)
+        except Exception as e:
+            print(f"Generation cache store failed: {str(e)}")
+
+    def stats(self):
+        """Hit/miss counts for this process plus the size of the stored cache."""
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses}
+        try:
+            stored = self.db.get_generation_cache_stats()
+            stats.update({'entries': stored['entries'], 'bytes': stored['bytes'], 'lifetime_hits': stored['hits']})
+        except Exception:
+            pass
+        return stats
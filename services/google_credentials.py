@@ -0,0 +1,165 @@
+import os
+import sys
+import pickle
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+def _utcnow():
+    # google-auth keeps Credentials.expiry as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _can_prompt():
+    # The consent flow waits on a browser; without a terminal (a service, cron)
+    # nobody is there to finish it and the process would just hang
+    return sys.stdin is not None and sys.stdin.isatty()
+
+class GoogleCredentialManager:
+    """Process-wide owner of Google OAuth credentials, one per token file.
+
+    Every Google client asking for the same token file gets the same
+    Credentials object, so there's one refresh and one writer per file.
+    A background thread refreshes tokens GOOGLE_TOKEN_REFRESH_MARGIN seconds
+    before they expire, keeping the refresh round-trip off the request path,
+    and token files are replaced atomically so a crash or a concurrent
+    reader never sees half a pickle.
+    """
+
+    def __init__(self):
+        self.refresh_margin = timedelta(seconds=int(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN', '600')))
+        self.retry_delay = float(os.getenv('GOOGLE_TOKEN_RETRY_DELAY', '60'))
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def credentials(self, token_path, scopes, credentials_path=None, interactive=True):
+        """Return valid credentials for token_path, loading, refreshing or
+        (if interactive) running the consent flow the first time. Each set of
+        scopes is checked against the shared credentials the first time it's
+        asked for, whichever client loaded them."""
+        key = os.path.abspath(token_path)
+        wanted = frozenset(scopes)
+        with self._lock:
+            entry = self._entries.setdefault(key, {'lock': threading.Lock(), 'creds': None, 'failed_at': None, 'checked': set()})
+        with entry['lock']:
+            current = entry['creds']
+            if current is None or not current.valid or wanted not in entry['checked']:
+                entry['creds'] = self._load(token_path, scopes, credentials_path, interactive, current)
+                if entry['creds'] is not current:
+                    # New consent may have granted a different set of scopes
+                    entry['checked'] = set()
+                entry['checked'].add(wanted)
+            creds = entry['creds']
+        self._ensure_refresher()
+        return creds
+
+    def _load(self, token_path, scopes, credentials_path, interactive, creds):
+        if creds is None and os.path.exists(token_path):
+            with open(token_path, 'rb') as token:
+                creds = pickle.load(token)
+
+        if creds and not creds.has_scopes(scopes):
+            # e.g. a token granted before a client started needing a new scope
+            missing = ', '.join(sorted(set(scopes) - set(creds.scopes or ())))
+            if interactive and not _can_prompt():
+                raise RuntimeError(f"Google token at {token_path} lacks {missing}; run the app once from "
+                                   f"a terminal to grant it")
+            if interactive:
+                print(f"Google token at {token_path} lacks {missing}; asking for consent again")
+                creds = None
+            else:
+                print(f"Google token at {token_path} lacks {missing}; requests needing it will fail")
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                from google.auth.transport.requests import Request
+                creds.refresh(Request())
+            else:
+                if not interactive:
+                    raise RuntimeError(f"No valid token at {token_path} and interactive login is disabled")
+                if not _can_prompt():
+                    raise RuntimeError(f"No valid token at {token_path}; run the app once from a terminal "
+                                       f"to sign in")
+                if not credentials_path or not os.path.exists(credentials_path):
+                    raise FileNotFoundError(f"Credentials file not found at: {credentials_path}")
+
+                from google_auth_oauthlib.flow import InstalledAppFlow
+                flow = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes)
+                creds = flow.run_local_server(port=0)
+            self._save(token_path, creds)
+        return creds
+
+    def _save(self, token_path, creds):
+        """Write the token file via a temporary file and an atomic rename."""
+        directory = os.path.dirname(os.path.abspath(token_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.token-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as token:
+                pickle.dump(creds, token)
+                token.flush()
+                os.fsync(token.fileno())
+            os.replace(temp_path, token_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refresh_loop, name='google-token-refresh', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _next_refresh(self, entry):
+        """When (naive UTC, like Credentials.expiry) an entry should be refreshed, or None."""
+        creds = entry['creds']
+        if creds is None or not creds.refresh_token or creds.expiry is None:
+            return None
+        due = creds.expiry - self.refresh_margin
+        if entry['failed_at'] is not None:
+            due = max(due, entry['failed_at'] + timedelta(seconds=self.retry_delay))
+        return due
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                entries = list(self._entries.items())
+            now = _utcnow()
+            next_due = None
+            for token_path, entry in entries:
+                due = self._next_refresh(entry)
+                if due is None:
+                    continue
+                if due <= now:
+                    self._refresh(token_path, entry)
+                    due = self._next_refresh(entry)
+                if due is not None and (next_due is None or due < next_due):
+                    next_due = due
+
+            timeout = None if next_due is None else max(1.0, (next_due - _utcnow()).total_seconds())
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _refresh(self, token_path, entry):
+        from google.auth.transport.requests import Request
+        with entry['lock']:
+            try:
+                entry['creds'].refresh(Request())
+                self._save(token_path, entry['creds'])
+                entry['failed_at'] = None
+            except Exception as e:
+                entry['failed_at'] = _utcnow()
+                print(f"Google token refresh failed for {token_path}: {str(e)}")
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_credential_manager():
+    """Return the process-wide credential manager, creating it on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = GoogleCredentialManager()
+        return _manager
@@ -1,17 +1,43 @@
 import os
-import json
 import glob
+import threading
 from datetime import datetime
+from services.health_export import iter_metrics
+
+# Metrics shown in the daily summary
+SUMMARY_METRICS = ('step_count', 'active_energy', 'walking_running_distance')
+
+# Metrics kept in the time-series store, with how each is shown in the trend section
+TREND_METRICS = {
+    'step_count': ('🦶 Steps', '{:,.0f}'),
+    'active_energy': ('🔥 Active Energy', '{:,.0f} kcal'),
+    'walking_running_distance': ('🏃 Distance', '{:.2f} mi'),
+}
+
+# Running ingests by export directory, so services sharing one don't repeat the work
+_ingests = {}
+_ingests_lock = threading.Lock()
 
 class HealthService:
-    def __init__(self, health_data_path):
-        """health_data_path should be the directory containing the export files"""
+    def __init__(self, health_data_path, db=None):
+        """health_data_path should be the directory containing the export
+        files; None (a batch user without their own) leaves health unconfigured"""
         self.data_dir = health_data_path
+        self.is_configured = bool(health_data_path)
+        self.db = db
+        # How long the trend section waits for new exports to be ingested
+        self.ingest_wait = float(os.getenv('HEALTH_INGEST_WAIT', '5'))
+        # Last parse, keyed by (path, mtime, size)
+        self._parsed = (None, None)
+        self._parse_lock = threading.Lock()
+
+    def _export_files(self):
+        pattern = os.path.join(self.data_dir, "HealthAutoExport-*.json")
+        return glob.glob(pattern)
 
     def _get_latest_export_file(self):
         # Find all health export files in the directory
-        pattern = os.path.join(self.data_dir, "HealthAutoExport-*.json")
-        files = glob.glob(pattern)
+        files = self._export_files()
         
         if not files:
             return None
@@ -19,13 +45,113 @@ class HealthService:
         # Sort by modification time to get the most recent
         return max(files, key=os.path.getmtime)
 
-    def _find_metric(self, data, metric_name):
-        for metric in data['data']['metrics']:
-            if metric['name'] == metric_name and metric['data']:
-                return metric['data'][0]['qty']
-        return 'N/A'
+    def _parse_export(self, path):
+        """Stream the summary metrics out of an export file: {name: first qty}."""
+        metrics = {}
+        for metric in iter_metrics(path, SUMMARY_METRICS):
+            if metric['name'] not in metrics and metric.get('data'):
+                metrics[metric['name']] = metric['data'][0]['qty']
+        return metrics
+
+    def _load_metrics(self, path):
+        """Parsed summary metrics for an export, reusing earlier parses of the
+        same unchanged file from memory or the database."""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        with self._parse_lock:
+            if self._parsed[0] == key:
+                return self._parsed[1]
+
+            metrics = self.db.get_health_export_cache(*key) if self.db else None
+            if metrics is None:
+                metrics = self._parse_export(path)
+                if self.db:
+                    self.db.store_health_export_cache(*key, metrics)
+
+            self._parsed = (key, metrics)
+            return metrics
+
+    def _find_metric(self, metrics, metric_name):
+        return metrics.get(metric_name, 'N/A')
+
+    def _sample_rows(self, path):
+        """(metric, ts, day, qty) rows for every trend metric data point in a file."""
+        for metric in iter_metrics(path, TREND_METRICS):
+            for point in metric.get('data') or []:
+                if point.get('qty') is None or not point.get('date'):
+                    continue
+                when = datetime.strptime(point['date'], '%Y-%m-%d %H:%M:%S %z')
+                yield (metric['name'], int(when.timestamp()), point['date'][:10], float(point['qty']))
+
+    def ingest_exports(self):
+        """Load any new or changed export files into the time-series store."""
+        source = os.path.abspath(self.data_dir)
+        ingested = self.db.get_ingested_health_files(source)
+        loaded = 0
+        for path in self._export_files():
+            stat = os.stat(path)
+            if ingested.get(path) == (stat.st_mtime, stat.st_size):
+                continue
+            self.db.store_health_samples(source, path, stat.st_mtime, stat.st_size, self._sample_rows(path))
+            loaded += 1
+        if loaded:
+            print(f"Ingested {loaded} health export file(s)")
+
+    def start_ingest(self):
+        """Ingest new export files on a background thread, unless one is
+        already ingesting this directory; returns the thread."""
+        source = os.path.abspath(self.data_dir)
+        with _ingests_lock:
+            thread = _ingests.get(source)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._ingest, name='health-ingest', daemon=True)
+                _ingests[source] = thread
+                thread.start()
+            return thread
+
+    def _ingest(self):
+        try:
+            self.ingest_exports()
+        except Exception as e:
+            print(f"Health export ingest failed: {str(e)}")
+
+    def get_trend_summary(self):
+        """7/30-day averages, week-over-week change and personal bests."""
+        if not self.db or not self.is_configured:
+            return ""
+        try:
+            # A first ingest of a large export can take longer than the health
+            # source's deadline; it carries on in the background and the
+            # trends stored so far are served meanwhile
+            ingest = self.start_ingest()
+            ingest.join(self.ingest_wait)
+            if ingest.is_alive():
+                print("Health exports are still being ingested; using the trends stored so far")
+            source = os.path.abspath(self.data_dir)
+            today = datetime.now().strftime('%Y-%m-%d')
+            lines = []
+            for metric, (label, fmt) in TREND_METRICS.items():
+                trends = self.db.get_health_trends(source, metric, today)
+                if not trends or trends['avg_7'] is None:
+                    continue
+                line = f"{label} trend: 7-day avg {fmt.format(trends['avg_7'])}"
+                if trends['prev_7']:
+                    change = (trends['avg_7'] - trends['prev_7']) / trends['prev_7'] * 100
+                    line += f" ({'▲' if change >= 0 else '▼'} {abs(change):.0f}% vs last week)"
+                if trends['avg_30'] is not None:
+                    line += f", 30-day avg {fmt.format(trends['avg_30'])}"
+                line += f", best {fmt.format(trends['best'])} on {trends['best_day']}"
+                lines.append(f"<li>{line}</li>")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"<li>Unable to compute health trends: {str(e)}</li>"
 
     def get_daily_summary(self):
+        if not self.is_configured:
+            return """
+                <li>❤️ Health data not configured. To see your activity:</li>
+                <li>Add a health_data_path with your Health Auto Export files</li>
+            """
         try:
             latest_file = self._get_latest_export_file()
             if not latest_file:
@@ -35,18 +161,16 @@ class HealthService:
                     <li>2. Export to the configured directory</li>
                 """
 
-            with open(latest_file, 'r') as f:
-                data = json.load(f)
+            metrics = self._load_metrics(latest_file)
             
-            # Extract metrics from the correct JSON structure
-            steps = self._find_metric(data, 'step_count')
-            active_energy = self._find_metric(data, 'active_energy')
-            distance = self._find_metric(data, 'walking_running_distance')
+            steps = self._find_metric(metrics, 'step_count')
+            active_energy = self._find_metric(metrics, 'active_energy')
+            distance = self._find_metric(metrics, 'walking_running_distance')
             
             return f"""
                 <li>🦶 Steps: {int(steps):,}</li>
                 <li>🔥 Active Energy: {int(active_energy)} kcal</li>
                 <li>🏃 Distance: {distance:.2f} mi</li>
-            """
+            """ + self.get_trend_summary()
         except Exception as e:
             return f"<li>Unable to read health data: {str(e)}</li>" 
\ No newline at end of file
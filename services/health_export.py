@@ -0,0 +1,163 @@
+import json
+import re
+
+# Streaming reader for HealthAutoExport files:
+#   {"data": {"metrics": [{"name": ..., "units": ..., "data": [...]}, ...], ...}}
+# Only one metric object is ever decoded at a time, and metrics that weren't
+# asked for are skipped over without being decoded at all.
+
+CHUNK_SIZE = 1 << 20
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'\s*')
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_STRING_REST = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+_SCALAR = re.compile(r'[^,}\]\s]+')
+_NAME_PREFIX = re.compile(r'\{\s*"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# Enough lookahead to see a metric's name before deciding to decode it
+_NAME_LOOKAHEAD = 512
+
+class _Reader:
+    """A sliding window over a text file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=CHUNK_SIZE):
+        """Read more text, discarding what has been consumed. False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed health export: expected '{char}'")
+        self.pos += 1
+
+    def ensure(self, count):
+        """Make sure at least count characters are buffered, if the file has them."""
+        while len(self.buf) - self.pos < count and self.fill():
+            pass
+
+    def read_string(self):
+        if self.peek() != '"':
+            raise ValueError("Malformed health export: expected a string")
+        while True:
+            match = _STRING_REST.match(self.buf, self.pos + 1)
+            if match:
+                value, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+                return value
+            if not self.fill():
+                raise ValueError("Malformed health export: unterminated string")
+
+    def decode_value(self):
+        self.peek()
+        size = CHUNK_SIZE
+        while True:
+            try:
+                value, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self.fill(size):
+                    raise
+                size *= 2
+
+    def skip_value(self):
+        char = self.peek()
+        if char == '"':
+            self.read_string()
+        elif char in ('{', '['):
+            self._skip_container()
+        else:
+            self.ensure(64)
+            match = _SCALAR.match(self.buf, self.pos)
+            if not match:
+                raise ValueError("Malformed health export: expected a value")
+            self.pos = match.end()
+
+    def _skip_container(self):
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("Malformed health export: unexpected end of file")
+                continue
+            char = match.group()
+            if char == '"':
+                rest = _STRING_REST.match(self.buf, match.end())
+                if rest is None:
+                    # The string runs into the next chunk; resume from its opening quote
+                    self.pos = match.start()
+                    if not self.fill():
+                        raise ValueError("Malformed health export: unterminated string")
+                    continue
+                self.pos = rest.end()
+                continue
+            self.pos = match.end()
+            depth += 1 if char in '[{' else -1
+            if depth == 0:
+                return
+
+def _seek_key(reader, key):
+    """Advance through the current object to the value of key. False if absent."""
+    reader.expect('{')
+    while True:
+        char = reader.peek()
+        if char == '}' or char is None:
+            return False
+        if char == ',':
+            reader.pos += 1
+            continue
+        name = reader.read_string()
+        reader.expect(':')
+        if name == key:
+            return True
+        reader.skip_value()
+
+def iter_metrics(path, names=None):
+    """Yield metric objects from a HealthAutoExport file.
+
+    If names is given, only metrics with those names are decoded and yielded.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f)
+        if not _seek_key(reader, 'data') or reader.peek() != '{':
+            return
+        if not _seek_key(reader, 'metrics'):
+            return
+        reader.expect('[')
+        while True:
+            char = reader.peek()
+            if char == ']' or char is None:
+                return
+            if char == ',':
+                reader.pos += 1
+                continue
+            if names is not None:
+                reader.ensure(_NAME_LOOKAHEAD)
+                match = _NAME_PREFIX.match(reader.buf, reader.pos)
+                if match and match.group(1) not in names:
+                    reader.skip_value()
+                    continue
+            metric = reader.decode_value()
+            if names is None or metric.get('name') in names:
+                yield metric
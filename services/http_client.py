@@ -0,0 +1,106 @@
+import os
+import random
+import threading
+import time
+
+# Responses worth retrying; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class HttpClient:
+    """Pooled HTTP client shared by the services.
+
+    One keep-alive session per process, so repeated calls to the same host
+    reuse the TCP/TLS connection. Every request has connect/read timeouts and
+    is retried a bounded number of times with jittered exponential backoff,
+    within an overall retry budget.
+    """
+
+    def __init__(self):
+        self.connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+        self.read_timeout = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+        self.max_retries = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+        self.backoff_base = float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))
+        self.backoff_cap = float(os.getenv('HTTP_BACKOFF_CAP', '4'))
+        # Total seconds a single call may spend waiting between retries
+        self.retry_budget = float(os.getenv('HTTP_RETRY_BUDGET', '8'))
+        pool_size = int(os.getenv('HTTP_POOL_SIZE', '10'))
+
+        # requests is imported here so importing this module stays cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._retryable_errors = (requests.ConnectionError, requests.Timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+            'User-Agent': 'MorningDigest/1.0',
+        })
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring a server's Retry-After."""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def get(self, url, params=None, headers=None):
+        """GET a URL, retrying connection errors, timeouts and 429/5xx responses."""
+        waited = 0.0
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = self.session.get(
+                    url,
+                    params=params,
+                    headers=headers,
+                    timeout=(self.connect_timeout, self.read_timeout)
+                )
+            except self._retryable_errors as e:
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                try:
+                    retry_after = float(response.headers.get('Retry-After', ''))
+                except ValueError:
+                    pass
+
+            delay = self._backoff(attempt, retry_after)
+            if waited + delay > self.retry_budget:
+                # Out of retry budget: surface whatever we got last
+                if response is None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    def get_json(self, url, params=None, cache=None, ttl=0):
+        """GET a JSON API, through a ResponseCache when one is given; raises
+        for error statuses."""
+        if cache:
+            return cache.get_json(self, url, params, ttl)
+        response = self.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """Return the process-wide HttpClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,32 @@
+import threading
+import time
+
+class LazyService:
+    """A service constructed on first use, at most once, from any thread.
+
+    Construction time is recorded so startup can be reported per service.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self.elapsed = None
+
+    @property
+    def ready(self):
+        return self.elapsed is not None
+
+    def get(self):
+        if self.elapsed is None:
+            with self._lock:
+                if self.elapsed is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    self.elapsed = time.perf_counter() - started
+        return self._instance
+
+def resolve(service):
+    """Return service itself, or build it if it's a LazyService."""
+    return service.get() if isinstance(service, LazyService) else service
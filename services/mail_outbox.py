@@ -0,0 +1,156 @@
+import os
+import time
+import atexit
+import smtplib
+import threading
+import contextvars
+from collections import deque
+from services import tracing
+
+class MailOutbox:
+    """Outbound mail queue with one reused SMTP session per account.
+
+    send() queues a message and returns immediately; a background thread
+    delivers queued mail over a single logged-in yagmail session, which is
+    reopened when it has been idle longer than SMTP_IDLE_TIMEOUT or the
+    server drops it. Failed messages are retried together, with backoff,
+    up to SMTP_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, email_address, app_password):
+        self.email = email_address
+        self.password = app_password
+        self.idle_timeout = float(os.getenv('SMTP_IDLE_TIMEOUT', '240'))
+        self.max_attempts = int(os.getenv('SMTP_MAX_ATTEMPTS', '3'))
+        self.retry_delay = float(os.getenv('SMTP_RETRY_DELAY', '30'))
+        # Overridable so mail can go to a local server (see benchmarks/)
+        self.host = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        self.ssl = os.getenv('SMTP_SSL', 'true').lower() == 'true'
+        self.starttls = os.getenv('SMTP_STARTTLS', 'false' if self.ssl else 'true').lower() == 'true'
+        self.port = int(os.getenv('SMTP_PORT', '465' if self.ssl else '587'))
+
+        self.yag = None
+        self.last_used = 0
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._retries = []
+        self._in_flight = 0
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def send(self, to, subject, contents):
+        """Queue a message for delivery."""
+        with self._cond:
+            self._pending.append({
+                'to': to,
+                'subject': subject,
+                'contents': contents,
+                'attempts': 0,
+                # Delivery is timed as part of the sender's trace
+                'context': contextvars.copy_context(),
+            })
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued (including retries) has been handled.
+        Returns False if the timeout passed first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._retries or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=30):
+        """Deliver what's queued, then log out."""
+        if not self.flush(timeout):
+            print("Mail outbox closed with undelivered messages")
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._disconnect()
+
+    def _connection(self):
+        if self.yag is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            # The server has probably dropped an idle session; start fresh
+            self._disconnect()
+        if self.yag is None:
+            import yagmail
+            self.yag = yagmail.SMTP(self.email, self.password, host=self.host, port=self.port,
+                                    smtp_ssl=self.ssl, smtp_starttls=self.starttls)
+        return self.yag
+
+    def _disconnect(self):
+        if self.yag is not None:
+            try:
+                self.yag.close()
+            except Exception:
+                pass
+            self.yag = None
+
+    def _deliver(self, message):
+        try:
+            self._connection().send(to=message['to'], subject=message['subject'], contents=message['contents'])
+        except smtplib.SMTPServerDisconnected:
+            # Reconnect once on a dropped session before counting it as a failure
+            self._disconnect()
+            self._connection().send(to=message['to'], subject=message['subject'], contents=message['contents'])
+        self.last_used = time.monotonic()
+
+    def _next_batch(self):
+        """Block until there's new mail or retries are due; None once closed."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due = [m for m in self._retries if m['next_attempt'] <= now]
+                if self._pending or due:
+                    batch = list(self._pending) + due
+                    self._pending.clear()
+                    self._retries = [m for m in self._retries if m['next_attempt'] > now]
+                    self._in_flight = len(batch)
+                    return batch
+                if self._closing:
+                    return None
+                timeout = min(m['next_attempt'] for m in self._retries) - now if self._retries else None
+                self._cond.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            failed = []
+            for message in batch:
+                try:
+                    message['context'].run(tracing.traced('smtp', self._deliver), message)
+                    print(f"Delivered \"{message['subject']}\" to {message['to']}")
+                except Exception as e:
+                    self._disconnect()
+                    message['attempts'] += 1
+                    if message['attempts'] >= self.max_attempts:
+                        print(f"Giving up on \"{message['subject']}\" to {message['to']} after {message['attempts']} attempts: {str(e)}")
+                        continue
+                    print(f"Failed to send email to {message['to']} ({str(e)}), will retry")
+                    message['next_attempt'] = time.monotonic() + self.retry_delay * 2 ** (message['attempts'] - 1)
+                    failed.append(message)
+            with self._cond:
+                self._retries.extend(failed)
+                self._in_flight = 0
+                self._cond.notify_all()
+
+_outboxes = {}
+_outboxes_lock = threading.Lock()
+
+def get_mail_outbox(email_address, app_password):
+    """Return the process-wide outbox for an account, creating it on first use."""
+    with _outboxes_lock:
+        outbox = _outboxes.get(email_address)
+        if outbox is None:
+            outbox = MailOutbox(email_address, app_password)
+            _outboxes[email_address] = outbox
+        return outbox
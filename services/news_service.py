@@ -1,13 +1,16 @@
-import requests
 import os
+from services.http_client import get_http_client
 
 class NewsService:
-    def __init__(self):
+    def __init__(self, http=None, cache=None):
         self.api_key = os.getenv('NEWS_API_KEY')
-        self.base_url = "https://newsapi.org/v2/top-headlines"
+        self.http = http or get_http_client()
+        self.cache = cache
+        self.cache_ttl = int(os.getenv('NEWS_CACHE_TTL', '1800'))
+        self.base_url = os.getenv('NEWS_BASE_URL', "https://newsapi.org/v2/top-headlines")
         self.is_configured = bool(self.api_key)
 
-    def get_top_stories(self, num_stories=5):
+    def get_top_stories(self, num_stories=5, language='en'):
         if not self.is_configured:
             return """
                 <li>📰 News API not configured. To see real news:</li>
@@ -18,13 +21,11 @@ class NewsService:
         try:
             params = {
                 'apiKey': self.api_key,
-                'language': 'en',
+                'language': language,
                 'pageSize': num_stories
             }
             
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self.http.get_json(self.base_url, params, self.cache, self.cache_ttl)
             
             if not data.get('articles'):
                 return "<li>No news stories available</li>"
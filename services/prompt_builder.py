@@ -0,0 +1,120 @@
+import os
+import re
+import html
+import math
+
+# Digest sections in prompt order: (key, label, priority). When the prompt is
+# over budget, lower-priority sections are trimmed first.
+DIGEST_SECTIONS = (
+    ('assignments', 'ASSIGNMENTS', 5),
+    ('health', 'HEALTH', 3),
+    ('events', 'CALENDAR', 4),
+    ('weather', 'WEATHER', 2),
+    ('news', 'NEWS', 1),
+)
+
+_BLOCK_TAG = re.compile(r'<\s*(?:li|p|div|br|tr|h\d)\b[^>]*>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+_URL = re.compile(r'https?://\S+|www\.\S+')
+# "... - View" links to the source page; the URL itself is stripped anyway
+_VIEW_LINK = re.compile(r'\s*-?\s*\bView$')
+# "1. Generate a new access token" - setup steps only shown when a source isn't configured
+_SETUP_STEP = re.compile(r'^\d+\.\s')
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+def section_items(markup):
+    """Turn a service's HTML snippet into a list of plain-text items.
+
+    Links, URLs, markup and setup instructions are dropped; they cost
+    tokens without telling the model anything it should write about.
+    Headings ("Due Today:") are folded into the item that follows them so
+    trimming never leaves a heading on its own.
+    """
+    if not markup:
+        return []
+    items = []
+    heading = None
+    for chunk in _BLOCK_TAG.split(markup):
+        text = html.unescape(_TAG.sub(' ', chunk))
+        text = _URL.sub('', text)
+        text = _VIEW_LINK.sub('', re.sub(r'\s+', ' ', text).strip(' -'))
+        if not text or _SETUP_STEP.match(text):
+            continue
+        if text.endswith(':'):
+            if heading:
+                items.append(heading.rstrip(':'))
+            heading = text
+            continue
+        items.append(f"{heading} {text}" if heading else text)
+        heading = None
+    if heading:
+        items.append(heading.rstrip(':'))
+    return items
+
+class PromptBuilder:
+    """Builds the data part of a prompt within a token budget.
+
+    Sections are reduced to plain-text items, then, while the prompt is over
+    GEMINI_PROMPT_TOKEN_BUDGET, the lowest-priority section that still has
+    more than one item loses its last item. A section is never emptied
+    completely; the model is told how many items were left out.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or int(os.getenv('GEMINI_PROMPT_TOKEN_BUDGET', '1500'))
+
+    def _render(self, label, items, dropped):
+        line = f"{label}: " + '; '.join(items)
+        if dropped:
+            line += f" (+{dropped} more not shown)"
+        return line
+
+    def build(self, template, sections, layout=DIGEST_SECTIONS):
+        """Fill template's {data} placeholder from sections (key -> HTML).
+
+        Returns (prompt, report); report has the estimated token counts and
+        which sections were trimmed.
+        """
+        fixed_tokens = estimate_tokens(template.replace('{data}', ''))
+        items = {key: section_items(sections.get(key)) for key, _, _ in layout}
+        original = {key: len(section) for key, section in items.items()}
+        kept = dict(original)
+
+        def data_tokens():
+            return sum(
+                estimate_tokens(self._render(label, items[key][:kept[key]], original[key] - kept[key])) + 1
+                for key, label, _ in layout
+            )
+
+        by_priority = sorted(layout, key=lambda section: section[2])
+        total = fixed_tokens + data_tokens()
+        while total > self.budget:
+            trimmable = [key for key, _, _ in by_priority if kept[key] > 1]
+            if not trimmable:
+                break
+            kept[trimmable[0]] -= 1
+            total = fixed_tokens + data_tokens()
+
+        data = '\n'.join(
+            self._render(label, items[key][:kept[key]], original[key] - kept[key])
+            for key, label, _ in layout
+        )
+        prompt = template.replace('{data}', data)
+        report = {
+            'tokens': estimate_tokens(prompt),
+            'budget': self.budget,
+            'raw_tokens': fixed_tokens + sum(estimate_tokens(sections.get(key) or '') for key, _, _ in layout),
+            'trimmed': {key: (original[key], kept[key]) for key in kept if kept[key] < original[key]},
+        }
+        return prompt, report
+
+    def describe(self, report):
+        """One-line summary of a build report for the logs."""
+        line = f"Gemini prompt: ~{report['tokens']} tokens (budget {report['budget']}, unprocessed ~{report['raw_tokens']})"
+        if report['trimmed']:
+            trimmed = ', '.join(f"{key} {before}->{after}" for key, (before, after) in report['trimmed'].items())
+            line += f"; trimmed {trimmed}"
+        return line
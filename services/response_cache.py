@@ -0,0 +1,58 @@
+import hashlib
+import json
+import time
+
+class ResponseCache:
+    """TTL cache for upstream JSON responses, persisted in the digest database.
+
+    Entries are keyed by URL + query parameters. Within the TTL the stored body
+    is returned without touching the network; after that the request is
+    revalidated with If-None-Match / If-Modified-Since when the upstream gave
+    us an ETag or Last-Modified, so an unchanged resource costs a 304.
+    """
+
+    def __init__(self, database_service):
+        self.db = database_service
+
+    def _key(self, url, params):
+        raw = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_json(self, http, url, params, ttl):
+        """Return the decoded JSON for url+params, from cache when fresh."""
+        key = self._key(url, params)
+        entry = self.db.get_cached_response(key)
+        now = time.time()
+        if entry and now - entry['fetched_at'] < ttl:
+            return json.loads(entry['body'])
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = http.get(url, params=params, headers=headers)
+            if response.status_code == 304 and entry:
+                self.db.touch_cached_response(key, now)
+                return json.loads(entry['body'])
+            response.raise_for_status()
+            body = response.text
+            data = json.loads(body)
+        except Exception as e:
+            if not entry:
+                raise
+            # Upstream is down; a stale answer beats none
+            print(f"Serving stale cached response for {url}: {str(e)}")
+            return json.loads(entry['body'])
+
+        self.db.store_cached_response(
+            key,
+            url,
+            body,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            now
+        )
+        return data
@@ -0,0 +1,248 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+def parse_time_of_day(value):
+    """'HH:MM' or 'HH:MM:SS' as a datetime.time."""
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time of day: {value!r} (expected HH:MM or HH:MM:SS)")
+
+def next_occurrence(time_of_day, timezone_name, after):
+    """The first epoch time after `after` at which the wall clock in
+    timezone_name (local time if None) reads time_of_day."""
+    at = parse_time_of_day(time_of_day)
+    zone = ZoneInfo(timezone_name) if timezone_name else None
+    day = datetime.fromtimestamp(after, zone).date()
+    while True:
+        candidate = datetime.combine(day, at, tzinfo=zone).timestamp()
+        if candidate > after:
+            return candidate
+        day += timedelta(days=1)
+
+class Scheduler:
+    """Runs daily jobs at wall-clock times in each job's own timezone.
+
+    Jobs are rows of the scheduled_jobs table, so they survive restarts.
+    One thread keeps them in a heap ordered by next run and sleeps on a
+    Condition until the earliest is due (or a job is added); due jobs run on
+    a pool of SCHEDULER_WORKERS threads. A job whose run was missed while
+    the process was down is run once on startup if it's at most its catch-up
+    window (SCHEDULER_CATCH_UP seconds by default) late, and otherwise
+    skipped to its next occurrence. A run is recorded as it starts, so one
+    interrupted by a crash isn't repeated.
+
+    handlers maps each job kind to a callable taking the job's payload.
+    Kinds in batch_kinds are instead called once per set of their jobs due
+    at the same moment, with the list of those jobs' payloads, so work they
+    share (e.g. one weather fetch per zip code) is done once.
+    """
+
+    # Re-check the heap at least this often, in case the wall clock jumped
+    MAX_SLEEP = 300
+
+    def __init__(self, db, handlers, batch_kinds=()):
+        self.db = db
+        self.handlers = handlers
+        self.batch_kinds = set(batch_kinds)
+        self.max_workers = max(1, int(os.getenv('SCHEDULER_WORKERS', '4')))
+        self.catch_up = float(os.getenv('SCHEDULER_CATCH_UP', '21600'))
+        self._cond = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._running = set()
+        self._stopping = False
+        self._thread = None
+        self._pool = None
+        self._jobs = {job['name']: job for job in db.get_scheduled_jobs()}
+
+    def set_jobs(self, kind, specs):
+        """Make the jobs of one kind match specs, a list of dicts with name,
+        time (HH:MM[:SS]), and optionally timezone, payload and catch_up
+        (seconds). Jobs keep their pending next run unless their time or
+        timezone changed, so missed runs are still caught up after a restart;
+        jobs of this kind that aren't listed are removed."""
+        with self._cond:
+            self._set_jobs(kind, specs)
+            self._cond.notify_all()
+
+    def _set_jobs(self, kind, specs):
+        now = time.time()
+        changed, wanted = [], set()
+        for spec in specs:
+            try:
+                job = self._job_from_spec(kind, spec, now)
+            except Exception as e:
+                print(f"Skipping scheduled job {spec.get('name')}: {str(e)}")
+                continue
+            wanted.add(job['name'])
+            existing = self._jobs.get(job['name'])
+            if existing and (existing['kind'], existing['time_of_day'], existing['timezone']) == \
+                    (job['kind'], job['time_of_day'], job['timezone']):
+                job['next_run'], job['last_run'] = existing['next_run'], existing['last_run']
+                if existing == job:
+                    continue
+            changed.append(job)
+
+        removed = [name for name, job in self._jobs.items() if job['kind'] == kind and name not in wanted]
+        if changed:
+            self.db.store_scheduled_jobs(changed)
+        if removed:
+            self.db.delete_scheduled_jobs(removed)
+        for name in removed:
+            del self._jobs[name]
+        for job in changed:
+            self._jobs[job['name']] = job
+            if self._thread is not None:
+                self._push(job)
+
+    def _job_from_spec(self, kind, spec, now):
+        timezone_name = spec.get('timezone') or None
+        time_of_day = spec['time']
+        return {
+            'name': spec['name'],
+            'kind': kind,
+            'time_of_day': time_of_day,
+            'timezone': timezone_name,
+            'payload': spec.get('payload'),
+            'catch_up': spec.get('catch_up'),
+            # Validates the time and timezone too
+            'next_run': next_occurrence(time_of_day, timezone_name, now),
+            'last_run': None,
+        }
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job['next_run'], next(self._sequence), job['name']))
+
+    def start(self):
+        """Catch up on missed runs, then start dispatching jobs as they come due."""
+        now = time.time()
+        skipped = []
+        with self._cond:
+            for job in self._jobs.values():
+                if job['next_run'] <= now:
+                    window = self.catch_up if job['catch_up'] is None else job['catch_up']
+                    late = now - job['next_run']
+                    if late <= window:
+                        print(f"Catching up on {job['name']}, {late / 60:.0f} minutes late")
+                    else:
+                        print(f"Skipping missed run of {job['name']} ({late / 3600:.1f} hours late)")
+                        job['next_run'] = next_occurrence(job['time_of_day'], job['timezone'], now)
+                        skipped.append(job)
+                self._push(job)
+            self._stopping = False
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scheduler-job')
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+        for job in skipped:
+            self.db.update_scheduled_job_run(job['name'], job['last_run'], job['next_run'])
+        print(f"Scheduler started with {len(self._jobs)} jobs")
+
+    def stop(self, wait=True):
+        """Stop dispatching; with wait, let running jobs finish."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._thread = None
+
+    def next_runs(self, limit=5):
+        """The soonest (name, next_run) pairs."""
+        with self._cond:
+            return [(job['name'], job['next_run'])
+                    for job in sorted(self._jobs.values(), key=lambda job: job['next_run'])[:limit]]
+
+    def _run(self):
+        with self._cond:
+            while not self._stopping:
+                if not self._heap:
+                    self._cond.wait(self.MAX_SLEEP)
+                    continue
+                when, _, name = self._heap[0]
+                job = self._jobs.get(name)
+                if job is None or job['next_run'] != when:
+                    # Removed or rescheduled since this entry was pushed
+                    heapq.heappop(self._heap)
+                    continue
+                delay = when - time.time()
+                if delay > 0:
+                    self._cond.wait(min(delay, self.MAX_SLEEP))
+                    continue
+                heapq.heappop(self._heap)
+                jobs = [job]
+                if job['kind'] in self.batch_kinds:
+                    jobs.extend(self._pop_batch(job['kind'], when))
+                self._dispatch(jobs, when)
+
+    def _pop_batch(self, kind, when):
+        """Pop the other jobs of kind due at exactly `when`. Called with the
+        condition held."""
+        batch, others = [], []
+        while self._heap and self._heap[0][0] == when:
+            _, _, name = heapq.heappop(self._heap)
+            job = self._jobs.get(name)
+            if job is None or job['next_run'] != when:
+                continue
+            (batch if job['kind'] == kind else others).append(job)
+        for job in others:
+            self._push(job)
+        return batch
+
+    def _dispatch(self, jobs, scheduled_for):
+        """Hand due jobs (one, or a batch of one kind) to the pool and queue
+        their next occurrences. Called with the condition held."""
+        due = []
+        for job in jobs:
+            job['next_run'] = next_occurrence(job['time_of_day'], job['timezone'], max(time.time(), scheduled_for))
+            self._push(job)
+            if job['name'] in self._running:
+                print(f"Skipping {job['name']}: the previous run is still going")
+                continue
+            self._running.add(job['name'])
+            due.append(dict(job))
+        if due:
+            self._pool.submit(self._execute, due, scheduled_for)
+
+    def _execute(self, jobs, scheduled_for):
+        started = time.time()
+        kind = jobs[0]['kind']
+        label = jobs[0]['name'] if len(jobs) == 1 else f"{len(jobs)} {kind} jobs"
+        # Record the run before starting it: a crash mid-send then skips to the
+        # next occurrence rather than sending the digest again on restart
+        runs = []
+        with self._cond:
+            for job in jobs:
+                current = self._jobs.get(job['name'])
+                if current is not None:
+                    current['last_run'] = started
+                    runs.append((job['name'], current['next_run']))
+        for name, next_run in runs:
+            try:
+                self.db.update_scheduled_job_run(name, started, next_run)
+            except Exception as e:
+                print(f"Failed to record run of {name}: {str(e)}")
+        try:
+            handler = self.handlers[kind]
+            lag = started - scheduled_for
+            if lag > 1:
+                print(f"Running {label} {lag:.1f}s after its scheduled time")
+            if kind in self.batch_kinds:
+                handler([job['payload'] for job in jobs])
+            else:
+                handler(jobs[0]['payload'])
+        except Exception as e:
+            print(f"Scheduled job {label} failed: {str(e)}")
+        finally:
+            with self._cond:
+                for job in jobs:
+                    self._running.discard(job['name'])
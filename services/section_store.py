@@ -0,0 +1,64 @@
+import zlib
+import hashlib
+
+# Content-addressed storage for digest sections.
+#
+# daily_digests rows hold the sha256 of each section's JSON text instead of
+# the text itself; the text is stored once, zlib-compressed, in
+# digest_sections, however many digests share it (placeholders, unchanged
+# news or weather, the same forecast for users in one zip code). refs counts
+# the digest columns pointing at a blob so replaced digests can release
+# theirs. These helpers take a cursor so they run inside the caller's
+# transaction; they're shared by DatabaseService and the migration that
+# converted existing rows.
+
+# (stored column, column as returned to callers) for each digest section
+SECTION_COLUMNS = (
+    ('health_section', 'health_data'),
+    ('calendar_section', 'calendar_events'),
+    ('weather_section', 'weather_info'),
+    ('news_section', 'news_updates'),
+    ('assignments_section', 'assignments'),
+)
+
+# SQLite's default limit on bound parameters is 999
+_IN_CHUNK = 500
+
+def section_key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def store_section(cursor, text):
+    """Reference a section's text, storing it if it's new; returns its key
+    (None for a missing section)."""
+    if text is None:
+        return None
+    key = section_key(text)
+    cursor.execute('UPDATE digest_sections SET refs = refs + 1 WHERE hash = ?', (key,))
+    if cursor.rowcount == 0:
+        cursor.execute('''
+            INSERT INTO digest_sections (hash, body, refs)
+            VALUES (?, ?, 1)
+        ''', (key, zlib.compress(text.encode('utf-8'))))
+    return key
+
+def release_sections(cursor, keys):
+    """Drop one reference to each key, deleting blobs nothing refers to anymore."""
+    keys = [key for key in keys if key is not None]
+    if not keys:
+        return
+    cursor.executemany('UPDATE digest_sections SET refs = refs - 1 WHERE hash = ?', [(key,) for key in keys])
+    cursor.executemany('DELETE FROM digest_sections WHERE hash = ? AND refs <= 0', [(key,) for key in set(keys)])
+
+def load_sections(cursor, keys):
+    """{key: text} for the given keys, each decompressed once."""
+    keys = list({key for key in keys if key is not None})
+    sections = {}
+    for start in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[start:start + _IN_CHUNK]
+        cursor.execute(f'''
+            SELECT hash, body FROM digest_sections
+            WHERE hash IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        for key, body in cursor.fetchall():
+            sections[key] = zlib.decompress(body).decode('utf-8')
+    return sections
@@ -0,0 +1,34 @@
+import threading
+from concurrent.futures import Future
+
+
+class SharedFetchCache:
+    """Run-scoped memo for upstream fetches that many users share.
+
+    The first caller for a key performs the fetch; concurrent callers for the
+    same key wait on that fetch instead of issuing their own request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fetch):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
@@ -0,0 +1,89 @@
+import math
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+
+# Lightweight span tracing for digest runs and listener messages.
+#
+# A trace groups the spans of one digest run or one incoming email; spans are
+# buffered into DatabaseService's span table (see attach) and summarized by
+# `python main.py stats`. The current trace lives in a context variable, so
+# work handed to another thread must be wrapped with bind() to stay in it.
+# Without an attached database every call here is a no-op.
+
+_sink = None
+_current = contextvars.ContextVar('trace', default=None)
+
+def attach(database_service):
+    """Write spans to this database from now on; returns it for chaining."""
+    global _sink
+    _sink = database_service
+    return database_service
+
+@contextmanager
+def trace(kind, name=None):
+    """Start a new trace (e.g. 'digest', 'listener') with a root span."""
+    token = _current.set((uuid.uuid4().hex[:16], kind))
+    try:
+        with span(name or kind):
+            yield
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name, detail=None):
+    """Time the enclosed block as one stage of the current trace."""
+    started_at = time.time()
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        record(name, started_at, time.perf_counter() - started, status, detail)
+
+def record(name, started_at, duration, status='ok', detail=None):
+    """Record a span measured elsewhere (duration in seconds)."""
+    if _sink is None:
+        return
+    trace_id, kind = _current.get() or (None, None)
+    try:
+        _sink.record_span(trace_id, kind, name, started_at, duration * 1000, status, detail)
+    except Exception as e:
+        print(f"Failed to record span {name}: {str(e)}")
+
+def traced(name, fn):
+    """Wrap fn so each call runs as a span."""
+    def run(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    return run
+
+def bind(fn):
+    """Wrap fn to run in the caller's trace, from whichever thread calls it."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(rows):
+    """Group (kind, name, duration_ms) rows, sorted by kind and name, into
+    (kind, name, count, p50, p95, p99, max) tuples."""
+    summary = []
+    group, durations = None, []
+    for kind, name, duration in list(rows) + [(None, None, None)]:
+        if (kind, name) != group:
+            if durations:
+                durations.sort()
+                summary.append((*group, len(durations), percentile(durations, 0.5),
+                                percentile(durations, 0.95), percentile(durations, 0.99), durations[-1]))
+            group, durations = (kind, name), []
+        if duration is not None:
+            durations.append(duration)
+    return summary
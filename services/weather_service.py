@@ -1,17 +1,23 @@
-import requests
 import os
+from services.http_client import get_http_client
 
 class WeatherService:
-    def __init__(self, api_key):
+    def __init__(self, api_key, http=None, cache=None):
         self.api_key = api_key
-        self.base_url = "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline"
+        self.http = http or get_http_client()
+        self.cache = cache
+        self.cache_ttl = int(os.getenv('WEATHER_CACHE_TTL', '900'))
+        self.base_url = os.getenv(
+            'WEATHER_BASE_URL',
+            "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline"
+        )
         self.location = os.getenv('ZIP_CODE', '10001')  # Default to NYC if not set
         self.is_configured = bool(api_key)
         
         if not self.is_configured:
             print("Weather API key not configured")
 
-    def get_daily_forecast(self):
+    def get_daily_forecast(self, location=None):
         if not self.is_configured:
             return """
                 <div class="weather-info">
@@ -22,7 +28,7 @@ class WeatherService:
             """
             
         try:
-            url = f"{self.base_url}/{self.location}/today"
+            url = f"{self.base_url}/{location or self.location}/today"
             params = {
                 "unitGroup": "us",
                 "key": self.api_key,
@@ -30,9 +36,7 @@ class WeatherService:
                 "include": "current,days"
             }
             
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self.http.get_json(url, params, self.cache, self.cache_ttl)
 
             current = data.get('currentConditions', {})
             today = data.get('days', [{}])[0]
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from fakes import write_health_export
+from main import BatchDigest, SharedFetchCache
+
+class UserHealthTest(unittest.TestCase):
+    def setUp(self):
+        owner_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(owner_dir.cleanup)
+        self.owner_dir = owner_dir.name
+        write_health_export(os.path.join(self.owner_dir, 'HealthAutoExport-owner.json'), 0.01)
+        digest = SimpleNamespace(db=None, weather=SimpleNamespace(location='10001'))
+        self.batch = BatchDigest(digest, [])
+
+    def _health(self, user):
+        with mock.patch.dict(os.environ, {'HEALTH_DATA_PATH': self.owner_dir}):
+            return self.batch._user_sources(user, SharedFetchCache())['health']()
+
+    def test_user_without_health_path_gets_no_owner_data(self):
+        section = self._health({'email': 'student@example.com'})
+        self.assertIn('not configured', section)
+        self.assertNotIn('Steps', section)
+
+    def test_user_with_health_path_gets_their_own_data(self):
+        section = self._health({'email': 'owner@example.com', 'health_data_path': self.owner_dir})
+        self.assertIn('Steps: 8,000', section)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import time
+import unittest
+from services.gemini_service import GeminiService
+
+try:
+    import google.generativeai as genai
+    from google.ai import generativelanguage as glm
+except ImportError:
+    genai = None
+
+class _StreamingClient:
+    """Stands in for the SDK's GAPIC client, so the real GenerativeModel
+    builds and validates its request without touching the network."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.requests = []
+
+    def stream_generate_content(self, request):
+        self.requests.append(request)
+        return iter([
+            glm.GenerateContentResponse(candidates=[{'content': {'parts': [{'text': chunk}], 'role': 'model'}}])
+            for chunk in self.chunks
+        ])
+
+@unittest.skipIf(genai is None, "google-generativeai is not installed")
+class GenerateStreamingTest(unittest.TestCase):
+    def _service(self, client):
+        service = GeminiService.__new__(GeminiService)
+        service.cache = None
+        service.model = genai.GenerativeModel(GeminiService.MODEL_NAME)
+        service.model._client = client
+        return service
+
+    def test_deadline_call_matches_the_sdk_signature(self):
+        client = _StreamingClient(['<p>Good ', 'morning</p>'])
+        text = self._service(client)._generate('Write the digest', deadline=time.monotonic() + 30)
+        self.assertEqual(text, '<p>Good morning</p>')
+        self.assertEqual(len(client.requests), 1)
+
+    def test_passed_deadline_raises_timeout(self):
+        client = _StreamingClient(['unused'])
+        with self.assertRaises(TimeoutError):
+            self._service(client)._generate('Write the digest', deadline=time.monotonic() - 1)
+        self.assertEqual(client.requests, [])
+
+if __name__ == '__main__':
+    unittest.main()